@@ -163,6 +163,7 @@ class ProjectWindow(ProjectBaseWindow):
     def loadProject(self):
         proj = pw.project.Project(pw.Config.getDomain(), self.projPath)
         proj.load()
+        proj.updateProjectMeta()
 
         # Check if we have settings.sqlite, generate if not
         settingsPath = os.path.join(proj.path, proj.settingsPath)
@@ -25,8 +25,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import stat
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen
 import tkinter as tk
 import tkinter.font as tkFont
+import tkinter.ttk as ttk
 
 import pyworkflow as pw
 from pyworkflow.project import Project
@@ -44,8 +50,37 @@ from pyworkflow.gui.widgets import IconButton, HotButton, Button
 from pyworkflow.utils.properties import Icon
 
 
+@lru_cache(maxsize=2048)
+def _prettyCreationDate(timestamp):
+    """ Cached creation date (without time) of a project, by integer
+    timestamp. Modification dates use prettyDate, which is relative to now,
+    so they can not be cached this way. """
+    return prettyTime(timestamp, time=False)
+
+
+def _checkDirectory(path, label):
+    """ Validate that path is an existing directory with a single stat call.
+    Return the error message, or None if it is valid. """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "%s does not exist" % label
+    if not stat.S_ISDIR(st.st_mode):
+        return "%s is not a directory" % label
+    return None
+
+
 class ProjectsView(tk.Frame):
     _PROJ_CONTAINER = "projectsframe"
+    _PROJ_COLORS = ['white', '#EAEBFF']
+    # Binding tags shared by the action labels of all project rows
+    _TAG_OPEN = "projOpen"
+    _TAG_DELETE = "projDelete"
+    _TAG_RENAME = "projRename"
+    # Named fonts, widgets refer to them by name
+    _FONT_NAME = "projNameFont"
+    _FONT_DATE = "projDateFont"
+    _FONT_DEL = "projDelFont"
 
     def __init__(self, parent, windows, **args):
         tk.Frame.__init__(self, parent, bg='white', **args)
@@ -58,14 +93,27 @@ class ProjectsView(tk.Frame):
         smallSize = pwgui.cfgFontSize - 2
         fontName = pwgui.cfgFontName
 
-        self.projNameFont = tkFont.Font(size=bigSize, family=fontName,
-                                        weight='bold')
-        self.projDateFont = tkFont.Font(size=smallSize, family=fontName)
-        self.projDelFont = tkFont.Font(size=smallSize, family=fontName,
-                                       weight='bold')
+        self.projNameFont = self._namedFont(self._FONT_NAME, size=bigSize,
+                                            family=fontName, weight='bold')
+        self.projDateFont = self._namedFont(self._FONT_DATE, size=smallSize,
+                                            family=fontName)
+        self.projDelFont = self._namedFont(self._FONT_DEL, size=smallSize,
+                                           family=fontName, weight='bold')
+        self._configureStyles()
+        # Estimated height of a project row before its labels are created
+        self._rowHeight = (self.projNameFont.metrics('linespace') +
+                           self.projDelFont.metrics('linespace') + 8)
         self.manager = Manager()
+        self._projectsCache = ()
+        self._projectsByIndex = {}
+        self._projectFrames = {}
+        self._labelsByIndex = {}
+        self._materialized = set()
+        self._projContainer = None
+        self._nextIndex = 0
+        self._filterAfterId = None
+        self._refreshAfterId = None
 
-        self.filter = tk.StringVar()
         self.filterBox = None
         self.addActionsFrame()
 
@@ -73,12 +121,52 @@ class ProjectsView(tk.Frame):
         self.rowconfigure(1, weight=1)
         text = TaggedText(self, width=40, height=15, bd=0, bg='white')
         text.grid(row=1, columnspan=2, column=0, sticky='news')
+        # Materialize the visible rows when scrolling or resizing the list
+        text.configure(yscrollcommand=self._onListScroll)
+        text.bind('<Configure>', self._scheduleRefreshVisible, add='+')
+        self.text = text
+
+        # One handler per action for all rows, the project is taken from
+        # the name of the row frame containing the clicked label
+        self.bind_class(self._TAG_OPEN, '<Button-1>',
+                        lambda e: self.openProject(self._eventProject(e).projName))
+        self.bind_class(self._TAG_DELETE, '<Button-1>',
+                        lambda e: self.deleteProject(self._eventProject(e)))
+        self.bind_class(self._TAG_RENAME, '<Button-1>',
+                        lambda e: self.renameProject(self._eventProject(e)))
 
+        # Show the (empty) list and fill it when the projects are listed
         self.createProjectList(text)
-        text.setReadOnly(True)
-        self.text = text
+        self._loadProjectsAsync()
         self.filterBox.focus_set()
 
+    @staticmethod
+    def _namedFont(name, **kwargs):
+        """ Create the named font, or reuse it if it already exists. """
+        if name in tkFont.names():
+            font = tkFont.Font(name=name, exists=True)
+            font.configure(**kwargs)
+            return font
+        return tkFont.Font(name=name, **kwargs)
+
+    def _configureStyles(self):
+        """ Create the themed styles of the project row labels, one set
+        for each of the rows background colors. """
+        self.style = ttk.Style()
+        self._rowStyles = {}
+        for i, color in enumerate(self._PROJ_COLORS):
+            styles = {}
+            for key, font, fg in [('Name', self._FONT_NAME, None),
+                                  ('Date', self._FONT_DATE, None),
+                                  ('Del', self._FONT_DEL, None),
+                                  ('Link', self._FONT_DATE, 'grey')]:
+                styleName = 'Project%s%d.TLabel' % (key, i)
+                self.style.configure(styleName, font=font, background=color)
+                if fg:
+                    self.style.configure(styleName, foreground=fg)
+                styles[key] = styleName
+            self._rowStyles[color] = styles
+
     def addActionsFrame(self):
         """ Add the "toolbar" for actions like create project, import
          project or filter"""
@@ -100,77 +188,219 @@ class ProjectsView(tk.Frame):
         # Add the Import project button
         btn = tk.Label(btnFrame, bg=bg, text="Filter:", font=self.projNameFont)
         btn.grid(row=0, column=2, sticky='nse', padx=10, pady=10)
-        self.filterBox = tk.Entry(btnFrame, font=self.projNameFont, textvariable=self.filter)
+        self.filterBox = tk.Entry(btnFrame, font=self.projNameFont)
         self.filterBox.grid(row=0, column=3, sticky='ne', padx=10, pady=12)
         self.filterBox.bind('<Return>', self._onFilter)
         self.filterBox.bind('<KP_Enter>', self._onFilter)
 
+    def _loadProjectsAsync(self):
+        """ List the projects in a worker thread, the scan of the projects
+        folder can be slow (e.g. network file systems) and should not block
+        the GUI. """
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.manager.listProjects)
+        executor.shutdown(wait=False)
+        self.after(50, self._checkProjectsLoaded, future)
+
+    def _checkProjectsLoaded(self, future):
+        """ Poll the listing from the Tk thread, since Tk calls are not
+        safe from the worker thread. """
+        if not future.done():
+            self.after(50, self._checkProjectsLoaded, future)
+            return
+
+        try:
+            projList = future.result()
+        except Exception as ex:
+            logger.exception("Couldn't list the projects")
+            showError("Projects not loaded",
+                      "Couldn't list the projects: %s" % ex, self.root)
+            projList = []
+
+        self._loadProjects(projList)
+        self.createProjectList(self.text)
+
+    def _loadProjects(self, projList):
+        """ Keep the list of projects (as returned by the manager) cached.
+        It should be called only when the projects on disk change,
+        filtering uses the cached list. """
+        # Already sorted by date, keep it as an immutable tuple
+        self._projectsCache = tuple(projList)
+        self._projectsByIndex = {}
+        for i, p in enumerate(self._projectsCache):
+            p.index = "index%s" % i
+            self._prepareProjectInfo(p)
+            self._projectsByIndex[p.index] = p
+        self._nextIndex = len(self._projectsCache)
+
+    def _prepareProjectInfo(self, projInfo):
+        """ Precompute the values of the project info used by the filter
+        and the project label. """
+        mDate = prettyDate(projInfo.mTime)
+        cDate = _prettyCreationDate(int(projInfo.cTime))
+        # Lets' use the name anc creation date for now:
+        projInfo._searchString = "~".join([projInfo.getName().lower(), mDate, cDate])
+        projInfo._dateMsg = f"{Message.LABEL_MODIFIED}{mDate}    {Message.LABEL_CREATED}{cDate}"
+        projInfo._isLink = projInfo.isLink()
+        projInfo._realPath = projInfo.realPath() if projInfo._isLink else None
+
     def createProjectList(self, text):
         """Load the list of projects"""
-        r = 0
         text.setReadOnly(False)
         text.clear()
         parent = tk.Frame(text, bg='white', name=self._PROJ_CONTAINER)
-        parent.columnconfigure(0, weight=1)
-        colors = ['white', '#EAEBFF']
-        for i, p in enumerate(self.manager.listProjects()):
-            try:
-                # Add creation time to project info
-                # Add if it's a link
-                p.index = "index%s" % i
-
-                # Consider the filter
-                if not self._doesProjectMatchFilter(p):
-                    continue
+        colors = self._PROJ_COLORS
+        self._projContainer = parent
+        self._projectFrames = {}
+        self._labelsByIndex = {}
+        self._materialized = set()
+        for i, p in enumerate(self._projectsCache):
+            self._projectFrames[p.index] = self._createProjectRow(parent, p,
+                                                                  colors[i % 2])
+
+        # The text is updated once with the whole container, then the rows
+        # are gridded and laid out in a single pass
+        text.window_create(tk.INSERT, window=parent)
+        text.bindWidget(parent)
+        text.setReadOnly(True)
+        self._applyFilter()
+        self.update_idletasks()
+
+    def _applyFilter(self):
+        """ Show only the already created project frames that match the
+        filter, hiding the rest, with no need to rebuild the widgets. """
+        filterStr = self.filterBox.get().lower()
+        visibleFrames = []
+        for p in self._projectsCache:
+            frame = self._projectFrames.get(p.index)
+            if frame is not None and self._doesProjectMatchFilter(p, filterStr):
+                visibleFrames.append(frame)
+
+        # Packing keeps the order of insertion, so re-pack the visible rows
+        for frame in self._projContainer.pack_slaves():
+            frame.pack_forget()
+        for frame in visibleFrames:
+            frame.pack(side=tk.TOP, fill=tk.X, padx=10, pady=5)
+
+        self._scheduleRefreshVisible()
+
+    def _onListScroll(self, first, last):
+        self.text.vscroll.set(first, last)
+        self._scheduleRefreshVisible()
+
+    def _scheduleRefreshVisible(self, e=None):
+        if self._refreshAfterId is None:
+            self._refreshAfterId = self.after_idle(self._refreshVisible)
+
+    def _refreshVisible(self):
+        """ Create the labels of the project rows that are visible, or
+        close to be visible, in the list. The rest of rows are just empty
+        frames, so the list cost does not grow with the number of projects.
+        """
+        self._refreshAfterId = None
+        parent = self._projContainer
+        if parent is None:
+            return
 
-                frame = self.createProjectLabel(parent, p, color=colors[i % 2])
-                frame.grid(row=r, column=0, padx=10, pady=5, sticky='new')
-                r += 1
+        parent.update_idletasks()
+        # Visible region in the projects container coordinates, with one
+        # extra page above and below
+        page = self.text.winfo_height()
+        top = self.text.winfo_rooty() - parent.winfo_rooty() - page
+        bottom = top + 3 * page
+
+        # First collect the rows to create, so geometry queries are not
+        # interleaved with the widgets creation
+        newRows = []
+        for p in self._projectsCache:
+            frame = self._projectFrames.get(p.index)
+            if frame is None or not frame.winfo_manager():
+                continue  # hidden by the filter
+
+            y = frame.winfo_y()
+            if y > bottom:
+                break
+
+            if p.index not in self._materialized and y + frame.winfo_height() >= top:
+                newRows.append((frame, p))
+
+        if not newRows:
+            return
 
+        # Do not propagate the geometry of the container per each new row,
+        # only once after all of them are created
+        parent.pack_propagate(False)
+        for frame, p in newRows:
+            self._materialized.add(p.index)
+            try:
+                self.createProjectLabel(frame, p)
             except Exception as ex:
                 logger.error("Couldn't load project %s" % p.getName(), exc_info=True)
+        parent.pack_propagate(True)
+        parent.update_idletasks()
 
-        text.window_create(tk.INSERT, window=parent)
-        text.bindWidget(parent)
-        text.setReadOnly(True)
+    def _createProjectRow(self, parent, projInfo, color):
+        """ Create the (empty) frame of a project row, the labels are created
+        later by createProjectLabel when the row becomes visible. """
+        return tk.Frame(parent, bg=color, name=projInfo.index,
+                        height=self._rowHeight)
 
-    def createProjectLabel(self, parent, projInfo, color):
-        frame = tk.Frame(parent, bg=color, name=projInfo.index)
+    def createProjectLabel(self, frame, projInfo):
+        styles = self._rowStyles[frame.cget('bg')]
         # ROW1
         # Project name
-        label = tk.Label(frame, text=projInfo.projName, anchor='nw', bg=color,
-                         justify=tk.LEFT, font=self.projNameFont, cursor='hand1', width=50)
+        label = ttk.Label(frame, text=projInfo.projName, anchor='nw',
+                          justify=tk.LEFT, style=styles['Name'], cursor='hand1', width=50)
         label.grid(row=0, column=0, padx=2, pady=2, sticky='nw')
-        label.bind('<Button-1>', lambda e: self.openProject(projInfo.projName))
+        self._addBindTag(label, self._TAG_OPEN)
+        self._labelsByIndex[projInfo.index] = label
 
         # ROW2
         # Timestamp line
-        dateMsg = '%s%s    %s%s' % (Message.LABEL_MODIFIED, prettyDate(projInfo.mTime),
-                                    Message.LABEL_CREATED, prettyTime(projInfo.cTime, time=False))
-        dateLabel = tk.Label(frame, text=dateMsg, font=self.projDateFont, bg=color)
+        dateLabel = ttk.Label(frame, text=projInfo._dateMsg, style=styles['Date'])
         dateLabel.grid(row=1, column=0, sticky='nw')
         # Delete action
-        delLabel = tk.Label(frame, text=Message.LABEL_DELETE_PROJECT, font=self.projDelFont, bg=color, cursor='hand1')
+        delLabel = ttk.Label(frame, text=Message.LABEL_DELETE_PROJECT, style=styles['Del'], cursor='hand1')
         delLabel.grid(row=1, column=1, padx=10)
-        delLabel.bind('<Button-1>', lambda e: self.deleteProject(projInfo))
+        self._addBindTag(delLabel, self._TAG_DELETE)
         # Rename action
-        mvLabel = tk.Label(frame, text=Message.LABEL_RENAME_PROJECT, font=self.projDelFont, bg=color, cursor='hand1')
+        mvLabel = ttk.Label(frame, text=Message.LABEL_RENAME_PROJECT, style=styles['Del'], cursor='hand1')
         mvLabel.grid(row=1, column=2)
-        mvLabel.bind('<Button-1>', lambda e: self.renameProject(projInfo.projName))
+        self._addBindTag(mvLabel, self._TAG_RENAME)
 
         # ROW3
-        if projInfo.isLink():
-            linkMsg = 'link --> ' + projInfo.realPath()
-            lblLink = tk.Label(frame, text=linkMsg, font=self.projDateFont, bg=color, fg='grey', justify=tk.LEFT)
+        if projInfo._isLink:
+            linkMsg = 'link --> ' + projInfo._realPath
+            lblLink = ttk.Label(frame, text=linkMsg, style=styles['Link'], justify=tk.LEFT)
             lblLink.grid(row=2, column=0, columnspan=3, sticky='w')
 
-        return frame
+    @staticmethod
+    def _addBindTag(widget, tag):
+        widget.bindtags((tag,) + widget.bindtags())
+
+    def _eventProject(self, event):
+        """ Return the project info of the row where the event happened """
+        return self._projectsByIndex[event.widget.master.winfo_name()]
 
     def createNewProject(self, projName, projLocation):
         proj = self.manager.createProject(projName, location=projLocation)
-        self.createProjectList(self.text)
+        self._appendProjectRow(proj.getShortName())
         self.openProject(proj.getShortName())
 
+    def _appendProjectRow(self, projName):
+        """ Add the row of a new project without rebuilding the others.
+        The new project is the most recent one, so it goes first. """
+        p = self.manager.getProjectInfo(projName)
+        p.index = "index%s" % self._nextIndex
+        self._prepareProjectInfo(p)
+        color = self._PROJ_COLORS[self._nextIndex % 2]
+        self._nextIndex += 1
+        self._projectsCache = (p,) + self._projectsCache
+        self._projectsByIndex[p.index] = p
+        self._projectFrames[p.index] = self._createProjectRow(self._projContainer,
+                                                              p, color)
+        self._applyFilter()
+
     def _onCreateProject(self, e=None):
         projWindow = ProjectCreateWindow("Create project", self)
         projWindow.show()
@@ -180,30 +410,37 @@ class ProjectsView(tk.Frame):
         importProjWindow.show()
 
     def _onFilter(self, e=None):
-        self.createProjectList(self.text)
+        # Coalesce bursts of filter events, only the last one is applied
+        if self._filterAfterId is not None:
+            self.after_cancel(self._filterAfterId)
+        self._filterAfterId = self.after(150, self._onFilterTimeout)
+
+    def _onFilterTimeout(self):
+        self._filterAfterId = None
+        self._applyFilter()
 
     def _setFocusToList(self, e=None):
         self.text.focus_set()
 
-    def _doesProjectMatchFilter(self, project):
-        """ Returns true if the project matches the filter"""
-        # Lets' use the name anc creation date for now:
-        searchString = "~".join([project.getName().lower(),
-                                 prettyDate(project.mTime),
-                                 prettyTime(project.cTime, time=False)])
-
-        return self.filter.get().lower() in searchString
+    def _doesProjectMatchFilter(self, project, filterStr):
+        """ Returns true if the project matches the (lower case) filter"""
+        if not filterStr:
+            return True
+        return filterStr in project._searchString
 
     def importProject(self, projLocation, copyFiles, projName, searchLocation):
 
         self.manager.importProject(projLocation, copyFiles, projName, searchLocation)
-        self.createProjectList(self.text)
+        self._appendProjectRow(projName)
         self.openProject(projName)
 
     def openProject(self, projName):
-        from subprocess import Popen
         script = pw.join(pw.APPS, 'pw_project.py')
-        Popen([pw.PYTHON, script, projName])
+        # Launch from a thread, forking a big GUI process may block the
+        # main loop for a while
+        t = threading.Thread(name="open project %s" % projName, daemon=True,
+                             target=lambda: Popen([pw.PYTHON, script, projName]))
+        t.start()
 
     def deleteProject(self, projInfo):
 
@@ -215,11 +452,17 @@ class ProjectsView(tk.Frame):
             logger.info("User agreed to delete project %s" % projName)
             self.manager.deleteProject(projName)
 
-            #Delete the frame
-            self.text.children[self._PROJ_CONTAINER].children[projInfo.index].grid_forget()
+            # Delete the frame and forget the project
+            self._projectsCache = tuple(pi for pi in self._projectsCache
+                                        if pi is not projInfo)
+            self._projectsByIndex.pop(projInfo.index)
+            self._projectFrames.pop(projInfo.index).destroy()
+            self._labelsByIndex.pop(projInfo.index, None)
+            self._materialized.discard(projInfo.index)
 
 
-    def renameProject(self, projName):
+    def renameProject(self, projInfo):
+        projName = projInfo.projName
         newName = askString("Rename project %s" % projName, "Enter new name:", self.root)
         if not newName or newName == projName:
             return
@@ -228,7 +471,17 @@ class ProjectsView(tk.Frame):
                       "Project name already exists: %s" % newName, self.root)
             return
         self.manager.renameProject(projName, newName)
-        self.createProjectList(self.text)
+        # Update the cached info and rebuild only the labels of this row
+        projInfo.projName = newName
+        projInfo.path = self.manager.getProjectPath(newName)
+        self._prepareProjectInfo(projInfo)
+        for child in self._projectFrames[projInfo.index].winfo_children():
+            child.destroy()
+        self._labelsByIndex.pop(projInfo.index, None)
+        self._materialized.discard(projInfo.index)
+        # The new name may not match the current filter, labels of visible
+        # rows are created again when refreshing
+        self._applyFilter()
 
 
 class ProjectCreateWindow(Window):
@@ -316,18 +569,19 @@ class ProjectCreateWindow(Window):
         # Validate that project location is not empty
         elif not projLocation:
             showError("Validation error", "Project location is empty", self.root)
-        # Validate that project location exists
-        elif not os.path.exists(projLocation):
-            showError("Validation error", "Project location does not exist", self.root)
-        # Validate that project location is a directory
-        elif not os.path.isdir(projLocation):
-            showError("Validation error", "Project location is not a directory", self.root)
-        # Validate that project path (location + name) does not exists
-        elif os.path.exists(os.path.join(projLocation, projName)):
-            showError("Validation error", "Project path already exists", self.root)
         else:
-            self.parent.createNewProject(projName, projLocation)
-            self.close()
+            # Validate that project location exists and is a directory
+            errorMessage = _checkDirectory(projLocation, "Project location")
+            # Validate that project path (location + name) does not exists
+            if (errorMessage is None and
+                    os.path.exists(os.path.join(projLocation, projName))):
+                errorMessage = "Project path already exists"
+
+            if errorMessage:
+                showError("Validation error", errorMessage, self.root)
+            else:
+                self.parent.createNewProject(projName, projLocation)
+                self.close()
 
 
 class ProjectImportWindow(Window):
@@ -462,29 +716,24 @@ class ProjectImportWindow(Window):
         # Validate that project location is not empty
         if not projLocation:
             errorMessage = "Project location is empty\n"
-
-        # Validate that project location exists
-        elif not os.path.exists(projLocation):
-            errorMessage += "Project location does not exist\n"
-
-        # Validate that project location is a directory
-        elif not os.path.isdir(projLocation):
-            errorMessage += "Project location is not a directory\n"
-        # Validate that the project location is a scipion project folder
-        elif not os.path.exists(os.path.join(projLocation, Project.getDbName())):
-            errorMessage += "Project location doesn't look like a scipion folder\n"
+        else:
+            # Validate that project location exists and is a directory
+            locationError = _checkDirectory(projLocation, "Project location")
+            if locationError:
+                errorMessage += locationError + "\n"
+            # Validate that the project location is a scipion project folder
+            elif not os.path.exists(os.path.join(projLocation, Project.getDbName())):
+                errorMessage += "Project location doesn't look like a scipion folder\n"
 
         # Validate that there isn't already a project with the same name
         if manager.hasProject(projName):
             errorMessage += "Project [%s] already exists\n" % projName
 
-        # Validate that search location exists
+        # Validate that search location exists and is a directory
         if searchLocation:
-            if not os.path.exists(searchLocation):
-                errorMessage += "Raw files location does not exist\n"
-            # Validate that search location is a directory
-            elif not os.path.isdir(searchLocation):
-                errorMessage += "Raw files location is not a directory\n"
+            searchError = _checkDirectory(searchLocation, "Raw files location")
+            if searchError:
+                errorMessage += searchError + "\n"
 
         if errorMessage:
             showError("Validation error", errorMessage, self.root)
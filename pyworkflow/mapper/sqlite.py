@@ -40,12 +40,14 @@ NAME = 'name'
 
 class SqliteMapper(Mapper):
     """Specific Mapper implementation using Sqlite database"""
-    def __init__(self, dbName, dictClasses=None):
+    def __init__(self, dbName, dictClasses=None, pragmas=None):
         Mapper.__init__(self, dictClasses)
         self.__initObjDict()
         self.__initUpdateDict()
+        # Relations by name, cleared when relations are inserted or deleted
+        self._relationsByName = {}
         try:
-            self.db = SqliteObjectsDb(dbName)
+            self.db = SqliteObjectsDb(dbName, pragmas=pragmas)
         except Exception as ex:
             raise Exception('Error creating SqliteMapper, dbName: %s'
                             '\n error: %s' % (dbName, ex))
@@ -129,6 +131,13 @@ class SqliteMapper(Mapper):
         """Delete an object and all its childs"""
         self.deleteChilds(obj)
         self.db.deleteObject(obj.getObjId())
+
+    def deleteMany(self, objList):
+        """ Delete several objects and all their childs,
+        the objects themselves are removed in a single statement. """
+        for obj in objList:
+            self.deleteChilds(obj)
+        self.db.deleteObjects([obj.getObjId() for obj in objList])
     
     def __getNamePrefix(self, obj):
         if len(obj._objName) > 0 and '.' in obj._objName:
@@ -196,9 +205,40 @@ class SqliteMapper(Mapper):
                     self.fillObject(obj, objRow)
         return obj
 
+    def selectByIds(self, idList):
+        """ Build the objects with the given ids, fetching all the rows
+        in a single query. Return a dict {objId: obj}, ids not found in
+        the db are not included. """
+        objects = {}
+        missingIds = set()
+
+        for objId in idList:
+            if objId in self.objDict:
+                objects[objId] = self.objDict[objId]
+            else:
+                missingIds.add(objId)
+
+        for objRow in self.db.selectObjectsByIds(missingIds):
+            objId = objRow[ID]
+            # Could be already loaded as part of a previous object
+            obj = self.objDict.get(objId, None)
+            if obj is None:
+                obj = self._buildObjectFromClass(objRow['classname'])
+                if obj is not None:
+                    self.fillObject(obj, objRow)
+            if obj is not None:
+                objects[objId] = obj
+
+        return objects
+
     def exists(self, objId):
         return self.db.doesRowExist(objId)
 
+    def existingIds(self, idList):
+        """ Return the set of ids in idList that exist in the db,
+        without building the objects. """
+        return self.db.selectExistingIds(idList)
+
     def getParent(self, obj):
         """ Retrieve the parent object of another. """
         return self.selectById(obj._objParentId)
@@ -484,6 +524,7 @@ class SqliteMapper(Mapper):
         self.db.insertRelation(relName, creatorObj.getObjId(),
                                parentObj.getObjId(), childObj.getObjId(),
                                parentExt, childExt)
+        self._relationsByName.clear()
     
     def __objectsFromIds(self, objIds):
         """Return a list of objects, given a list of id's
@@ -518,18 +559,32 @@ class SqliteMapper(Mapper):
         """ Return all relations created by creatorObj. """
         return self.db.selectRelationsByCreator(creatorObj.getObjId())
     
-    def getRelationsByName(self, relationName):
-        """ Return all relations stored of a given type. """
-        return self.db.selectRelationsByName(relationName)
+    def getRelationsByName(self, relationName, refresh=False):
+        """ Return all relations stored of a given type.
+        The result is kept until relations are modified through this
+        mapper, use refresh=True to read them again from the db
+        (e.g. if other process could have modified them).
+        """
+        if refresh or relationName not in self._relationsByName:
+            self._relationsByName[relationName] = \
+                self.db.selectRelationsByName(relationName)
+        return self._relationsByName[relationName]
 
     def deleteRelations(self, creatorObj):
         """ Delete all relations created by object creatorObj """
         self.db.deleteRelationsByCreator(creatorObj.getObjId())
+        self._relationsByName.clear()
+
+    def deleteRelationsMany(self, creatorList):
+        """ Delete all relations created by any object in creatorList """
+        self.db.deleteRelationsByCreators([obj.getObjId() for obj in creatorList])
+        self._relationsByName.clear()
     
     def insertRelationData(self, relName, creatorId, parentId, childId,
                            parentExtended=None, childExtended=None):
         self.db.insertRelation(relName, creatorId, parentId, childId,
                                parentExtended, childExtended)
+        self._relationsByName.clear()
     
     
 class SqliteObjectsDb(SqliteDb):
@@ -549,15 +604,26 @@ class SqliteObjectsDb(SqliteDb):
                        "WHERE name=? AND object_%s_id=?")
     SELECT_RELATIONS = "SELECT * FROM Relations WHERE "
     EXISTS = "SELECT EXISTS(SELECT 1 FROM Objects WHERE %s=? LIMIT 1)"
+    # Max number of parameters in a statement (default SQLITE_MAX_VARIABLE_NUMBER)
+    MAX_PARAMS = 999
     
     def selectCmd(self, whereStr, orderByStr=' ORDER BY id'):
 
         whereStr = " WHERE " + whereStr if whereStr is not None else ''
         return self.SELECT + whereStr + orderByStr
     
+    def _iterIdChunks(self, idList):
+        """ Split idList in chunks that fit in a single statement.
+        Yield the '?,?,...' placeholders together with each chunk of ids.
+        """
+        ids = list(idList)
+        for i in range(0, len(ids), self.MAX_PARAMS):
+            chunk = ids[i:i + self.MAX_PARAMS]
+            yield ','.join('?' * len(chunk)), chunk
+
     def __init__(self, dbName, timeout=1000, pragmas=None):
         SqliteDb.__init__(self)
-        self._pragmas = pragmas or {}
+        self._pragmas = dict(pragmas or {})
         self._createConnection(dbName, timeout)
         self._initialize()
 
@@ -568,6 +634,9 @@ class SqliteObjectsDb(SqliteDb):
         if not tables:
             self.__createTables()
         else:
+            # Most pragmas only last for the connection, set them again
+            for pragma in self._pragmas.items():
+                self.executeCommand("PRAGMA %s=%s" % pragma)
             self.__updateTables()
         
     def __createTables(self):
@@ -659,12 +728,29 @@ class SqliteObjectsDb(SqliteDb):
         self.executeCommand(self.selectCmd(ID + "=?"), (objId,))
         return self.cursor.fetchone()
 
+    def selectObjectsByIds(self, idList):
+        """Select several objects given their ids"""
+        rows = []
+        for marks, ids in self._iterIdChunks(idList):
+            self.executeCommand(self.selectCmd("%s IN (%s)" % (ID, marks)), ids)
+            rows.extend(self.cursor.fetchall())
+        return rows
+
     def doesRowExist(self, objId):
         """Return True if a row with a given id exists"""
         self.executeCommand(self.EXISTS % ID, (objId,))
         one = self.cursor.fetchone()
         return one[0] == 1
 
+    def selectExistingIds(self, idList):
+        """Return the set of ids in idList that have a row"""
+        existing = set()
+        for marks, ids in self._iterIdChunks(idList):
+            self.executeCommand("SELECT id FROM Objects WHERE id IN (%s)"
+                                % marks, ids)
+            existing.update(row[0] for row in self.cursor.fetchall())
+        return existing
+
     def selectAllObjects(self):
         """Select all data at once"""
         self.executeCommand(self.selectCmd(ID + ">0", ' ORDER BY parent_id'))
@@ -708,7 +794,12 @@ class SqliteObjectsDb(SqliteDb):
     def deleteObject(self, objId):
         """Delete an existing object"""
         self.executeCommand(self.DELETE + ID + "=?", (objId,))
-        
+
+    def deleteObjects(self, idList):
+        """Delete several existing objects given their ids"""
+        for marks, ids in self._iterIdChunks(idList):
+            self.executeCommand(self.DELETE + "%s IN (%s)" % (ID, marks), ids)
+
     def deleteChildObjects(self, ancestor_namePrefix):
         """ Delete from db all objects that are childs 
         of an ancestor, now them will have the same starting prefix"""
@@ -756,6 +847,11 @@ class SqliteObjectsDb(SqliteDb):
     def deleteRelationsByCreator(self, parent_id):
         self.executeCommand("DELETE FROM Relations where parent_id=?", (parent_id,))
 
+    def deleteRelationsByCreators(self, parentIds):
+        for marks, ids in self._iterIdChunks(parentIds):
+            self.executeCommand("DELETE FROM Relations where parent_id IN (%s)"
+                                % marks, ids)
+
 
 class SqliteFlatMapper(Mapper):
     """Specific Flat Mapper implementation using Sqlite database"""
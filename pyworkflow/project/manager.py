@@ -96,6 +96,12 @@ class Manager(object):
             projList.sort(key=lambda k: k.mTime, reverse=True)
         return projList
     
+    def getProjectInfo(self, projectName):
+        """Return the ProjectInfo of an existing project given its name"""
+        p = self.getProjectPath(projectName)
+        stat = os.stat(p)
+        return ProjectInfo(projectName, stat.st_mtime, stat.st_ctime, p)
+
     def createProject(self, projectName, runsView=1, 
                       hostsConf=None, protocolsConf=None, location=None):
         """Create a new project.
@@ -28,12 +28,13 @@ import logging
 logger = logging.getLogger(__name__)
 
 import datetime as dt
+import itertools
 import json
 import os
 import re
+import sqlite3
 import time
-import traceback
-from collections import OrderedDict
+from collections import deque
 
 import pyworkflow as pw
 from pyworkflow.constants import PROJECT_DBNAME, PROJECT_SETTINGS
@@ -56,10 +57,18 @@ PROJECT_TMP = 'Tmp'
 PROJECT_UPLOAD = 'Uploads'
 PROJECT_CONFIG = '.config'
 PROJECT_CREATION_TIME = 'CreationTime'
+PROJECT_META = 'project.meta.json'
+# Connection pragmas for project and run dbs. journal_mode and synchronous
+# are left with their defaults since projects may live in network filesystems
+PROJECT_DB_PRAGMAS = {'temp_store': 'MEMORY',
+                      'cache_size': -64000}  # In KiB when negative
+# Seconds to wait for the run db snapshot and pages copied per backup step
+SNAPSHOT_TIMEOUT = 10
+SNAPSHOT_PAGES = 1024
 
 # Regex to get numbering suffix and automatically propose runName
-REGEX_NUMBER_ENDING = re.compile('(?P<prefix>.+)(?P<number>\(\d*\))\s*$')
-REGEX_NUMBER_ENDING_CP = re.compile('(?P<prefix>.+\s\(copy)(?P<number>.*)\)\s*$')
+REGEX_NUMBER_ENDING = re.compile(r'(?P<prefix>.+)\((?P<number>\d*)\)\s*')
+REGEX_NUMBER_ENDING_CP = re.compile(r'(?P<prefix>.+\s\(copy)(?P<number>.*)\)\s*')
 
 
 class Project(object):
@@ -84,16 +93,27 @@ class Project(object):
         self.path = os.path.abspath(path)
         self._isLink = os.path.islink(path)
         self._isInReadOnlyFolder = False
-        self.pathList = []  # Store all related paths
-        self.dbPath = self.__addPath(PROJECT_DBNAME)
-        self.logsPath = self.__addPath(PROJECT_LOGS)
-        self.runsPath = self.__addPath(PROJECT_RUNS)
-        self.tmpPath = self.__addPath(PROJECT_TMP)
-        self.uploadPath = self.__addPath(PROJECT_UPLOAD)
-        self.settingsPath = self.__addPath(PROJECT_SETTINGS)
-        self.configPath = self.__addPath(PROJECT_CONFIG)
+        # Paths are relative to the project folder
+        self.dbPath = PROJECT_DBNAME
+        self._absDbPath = os.path.join(self.path, PROJECT_DBNAME)
+        self.logsPath = PROJECT_LOGS
+        self.runsPath = PROJECT_RUNS
+        self.tmpPath = PROJECT_TMP
+        self.uploadPath = PROJECT_UPLOAD
+        self.settingsPath = PROJECT_SETTINGS
+        self.configPath = PROJECT_CONFIG
+        self._localConfigHosts = os.path.join(PROJECT_CONFIG,
+                                              pw.Config.SCIPION_HOSTS)
+        # Store all related paths, dbPath first (see setDbPath)
+        self.pathList = [self.dbPath, self.logsPath, self.runsPath,
+                         self.tmpPath, self.uploadPath, self.settingsPath,
+                         self.configPath]
         self.runs = None
         self._runsGraph = None
+        # Runs labels by id and their numbering suffixes,
+        # see _getRunLabelSuffixes
+        self._runLabels = None
+        self._runLabelSuffixes = None
         self._transformGraph = None
         self._sourceGraph = None
         self.address = ''
@@ -107,17 +127,13 @@ class Project(object):
         self._creationTime = None
         # Time stamp with the last run has been updated
         self._lastRunTime = None
+        # (key, value) of the last computed elapsed time
+        self._elapsedTime = None
 
     def getObjId(self):
         """ Return the unique id assigned to this project. """
         return os.path.basename(self.path)
 
-    def __addPath(self, *paths):
-        """Store a path needed for the project"""
-        p = self.getPath(*paths)
-        self.pathList.append(p)
-        return p
-
     def getPath(self, *paths):
         """Return path from the project root"""
         if paths:
@@ -150,9 +166,12 @@ class Project(object):
         """ Returns the time elapsed from the creation to the last
         execution time. """
         if self._creationTime and self._lastRunTime:
-            creationTs = self._creationTime
-            lastRunTs = self._lastRunTime.datetime()
-            return lastRunTs - creationTs
+            # Only recompute it when the last run time changes
+            key = (self._creationTime, self._lastRunTime.get())
+            if self._elapsedTime is None or self._elapsedTime[0] != key:
+                lastRunTs = self._lastRunTime.datetime()
+                self._elapsedTime = (key, lastRunTs - self._creationTime)
+            return self._elapsedTime[1]
         return None
 
     def getLeftTime(self):
@@ -168,10 +187,10 @@ class Project(object):
         This function is used when running a protocol where
         a project is loaded but using the protocol own sqlite file.
         """
-        # First remove from pathList the old dbPath
-        self.pathList.remove(self.dbPath)
+        # Replace the old dbPath in pathList, it is always the first one
         self.dbPath = os.path.abspath(dbPath)
-        self.pathList.append(self.dbPath)
+        self._absDbPath = self.dbPath
+        self.pathList[0] = self.dbPath
 
     def getName(self):
         return self.name
@@ -212,7 +231,7 @@ class Project(object):
         classesDict = pwobj.Dict(default=pwprot.LegacyProtocol)
         classesDict.update(self._domain.getMapperDict())
         classesDict.update(config.__dict__)
-        return SqliteMapper(sqliteFn, classesDict)
+        return SqliteMapper(sqliteFn, classesDict, pragmas=PROJECT_DB_PRAGMAS)
 
     def load(self, dbPath=None, hostsConf=None, protocolsConf=None, chdir=True,
              loadAllConfig=True):
@@ -230,7 +249,10 @@ class Project(object):
 
         """
 
-        if not os.path.exists(self.path):
+        # List the project folder once to check for the db and settings
+        try:
+            projEntries = set(os.listdir(self.path))
+        except (FileNotFoundError, NotADirectoryError):
             raise Exception("Cannot load project, path doesn't exist: %s"
                             % self.path)
 
@@ -243,43 +265,40 @@ class Project(object):
         if chdir:
             os.chdir(self.path)  # Before doing nothing go to project dir
 
-        try:
-            self._loadDb(dbPath)
-            self._loadHosts(hostsConf)
+        # Raises MissingProjectDbException if there is no project db,
+        # a critical error that should reach the caller
+        self._loadDb(dbPath, projEntries)
+        self._loadHosts(hostsConf)
 
-            if loadAllConfig:
+        if loadAllConfig:
 
-                # FIXME: Handle settings argument here
+            # FIXME: Handle settings argument here
 
-                # It is possible that settings does not exists if
-                # we are loading a project after a Project.setDbName,
-                # used when running protocols
-                settingsPath = os.path.join(self.path, self.settingsPath)
+            # It is possible that settings does not exists if
+            # we are loading a project after a Project.setDbName,
+            # used when running protocols
+            settingsPath = os.path.join(self.path, self.settingsPath)
 
-                logger.debug("settingsPath: %s" % settingsPath)
+            logger.debug("settingsPath: %s", settingsPath)
 
-                if os.path.exists(settingsPath):
-                    self.settings = config.ProjectSettings.load(settingsPath)
-                else:
-                    logger.info("settings is None")
-                    self.settings = None
+            if self.settingsPath in projEntries:
+                self.settings = config.ProjectSettings.load(settingsPath)
+            else:
+                logger.info("settings is None")
+                self.settings = None
 
-            self._loadCreationTime()
+        self._loadCreationTime()
 
-        # Catch DB not found exception (when loading a project from a folder
-        #  without project.sqlite
-        except MissingProjectDbException as noDBe:
-            # Raise it at before: This is a critical error and should be raised
-            raise noDBe
+    def _loadCreationTime(self):
+        # Load creation time, it should be in .config/project.meta.json,
+        # in project.sqlite or in some old projects in settings.sqlite
+        if self._creationTime is not None:
+            return
 
-        # Catch any less severe exception..to allow at least open the project.
-        # except Exception as e:
-        #     logger.info("ERROR: Project %s load failed.\n"
-        #           "       Message: %s\n" % (self.path, e))
+        self._creationTime = self._readProjectMeta().get('creationTime', None)
 
-    def _loadCreationTime(self):
-        # Load creation time, it should be in project.sqlite or
-        # in some old projects it is found in settings.sqlite
+        if self._creationTime is not None:
+            return
 
         creationTime = self.mapper.selectBy(name=PROJECT_CREATION_TIME)
 
@@ -290,15 +309,63 @@ class Project(object):
             # update the CreationTime in the project.sqlite
             self._creationTime = self.getSettingsCreationTime()
             self._storeCreationTime(self._creationTime)
+            self.mapper.commit()
+
+    def getProjectMetaPath(self):
+        """ Return the file where immutable project info, such as the
+        creation time, is kept to avoid querying the db on load. """
+        return os.path.join(self.path, PROJECT_CONFIG, PROJECT_META)
+
+    def _readProjectMeta(self):
+        """ Read the project meta file, returns an empty dict if
+        it does not exist or can not be parsed. """
+        try:
+            with open(self.getProjectMetaPath()) as f:
+                meta = json.load(f)
+            meta['creationTime'] = pwobj.String.getDatetime(meta['creationTime'])
+            return meta
+        except Exception:
+            return {}
+
+    def _writeProjectMeta(self):
+        """ Write the project meta file with the creation time.
+        The file is replaced atomically, so readers never get it half written.
+        """
+        metaPath = self.getProjectMetaPath()
+        tmpPath = '%s.%d.tmp' % (metaPath, os.getpid())
+        with open(tmpPath, 'w') as f:
+            json.dump({'creationTime': str(self._creationTime)}, f)
+        os.replace(tmpPath, metaPath)
+
+    def updateProjectMeta(self):
+        """ Write the project meta file if it is missing, so next loads
+        do not need to query the dbs for the creation time. This is done
+        from the GUI, protocol runs only read the file.
+        """
+        if (self.openedAsReadOnly() or self._creationTime is None
+                or os.path.exists(self.getProjectMetaPath())):
+            return
+        try:
+            self._writeProjectMeta()
+        except Exception as e:
+            logger.debug("Can't write project meta file: %s", e)
 
     # ---- Helper functions to load different pieces of a project
-    def _loadDb(self, dbPath):
-        """ Load the mapper from the sqlite file in dbPath. """
+    def _loadDb(self, dbPath, projEntries=None):
+        """ Load the mapper from the sqlite file in dbPath.
+        projEntries, if passed, are the names found in the project folder
+        and are used to check the default db without another stat.
+        """
         if dbPath is not None:
             self.setDbPath(dbPath)
 
-        absDbPath = os.path.join(self.path, self.dbPath)
-        if not os.path.exists(absDbPath):
+        absDbPath = self._absDbPath
+        if projEntries is not None and self.dbPath == PROJECT_DBNAME:
+            dbExists = PROJECT_DBNAME in projEntries
+        else:
+            dbExists = os.path.exists(absDbPath)
+
+        if not dbExists:
             raise MissingProjectDbException(
                 "Project database not found at '%s'" % absDbPath)
         self.mapper = self.createMapper(absDbPath)
@@ -311,7 +378,7 @@ class Project(object):
     def getLocalConfigHosts(self):
         """ Return the local file where the project will try to
         read the hosts configuration. """
-        return self.getPath(PROJECT_CONFIG, pw.Config.SCIPION_HOSTS)
+        return self._localConfigHosts
 
     def _loadHosts(self, hosts):
         """ Loads hosts configuration from hosts file. """
@@ -340,9 +407,9 @@ class Project(object):
         if hostName in self._hosts:
             hostKey = hostName
         else:
-            hostKey = self.getHostNames()[0]
-            logger.warning("Protocol host '%s' not found." % hostName)
-            logger.warning("         Using '%s' instead." % hostKey)
+            hostKey = next(iter(self._hosts))
+            logger.warning("Protocol host '%s' not found. Using '%s' instead.",
+                           hostName, hostKey)
 
         return self._hosts[hostKey]
 
@@ -367,7 +434,8 @@ class Project(object):
         # Create db through the mapper
         self.mapper = self.createMapper(self.dbPath)
         # Store creation time
-        self._storeCreationTime(dt.datetime.now())
+        self._creationTime = dt.datetime.now()
+        self._storeCreationTime(self._creationTime)
         # Load settings from .conf files and write .sqlite
         self.settings = self.createSettings(runsView=runsView,
                                             readOnly=readOnly)
@@ -375,15 +443,18 @@ class Project(object):
         for p in self.pathList:
             pwutils.path.makePath(p)
 
+        self._writeProjectMeta()
         self._loadHosts(hostsConf)
+        # Commit all bootstrap writes to the project db at once
+        self.mapper.commit()
 
     def _storeCreationTime(self, creationTime):
-        """ Store the creation time in the project db. """
+        """ Store the creation time in the project db.
+        The caller is responsible for committing the mapper. """
         # Store creation time
         creation = pwobj.String(objName=PROJECT_CREATION_TIME)
         creation.set(creationTime)
         self.mapper.insert(creation)
-        self.mapper.commit()
 
     def _cleanData(self):
         """Clean all project data"""
@@ -425,7 +496,7 @@ class Project(object):
                             protocol._updateSteps(lambda step: step.setStatus(pwprot.STATUS_SAVED))
                             protocol.setMapper(self.createMapper(protocol.getDbPath()))
                             protocol._store()
-                            self._storeProtocol(protocol)
+                            # scheduleProtocol stores and commits it in the project db
                             self.scheduleProtocol(protocol,
                                                   initialSleepTime=level*INITIAL_SLEEP_TIME)
                         except Exception as ex:
@@ -471,13 +542,11 @@ class Project(object):
                         break
                 else:
                     protocol.setStatus(pwprot.STATUS_SAVED)
-                    self._storeProtocol(protocol)
                     protocol.runMode.set(MODE_RESTART)
                     self._setupProtocol(protocol)
                     protocol.makePathsAndClean()  # Create working dir if necessary
                     # Delete the relations created by this protocol
                     self.mapper.deleteRelations(self)
-                    self.mapper.commit()
                     self.mapper.store(protocol)
                     self.mapper.commit()
 
@@ -489,20 +558,22 @@ class Project(object):
            the extended parameter has a parent output value
         """
         # Take the old configuration attributes and fix the pointer
-        oldStylePointerList = [item for key, item in
-                               protocol.iterInputAttributes()
-                               if not isinstance(item.getObjValue(),
-                                                 pwprot.Protocol)]
-        if oldStylePointerList:
+        oldStylePointers = (item for _, item in protocol.iterInputAttributes()
+                            if not isinstance(item.getObjValue(),
+                                              pwprot.Protocol))
+        firstPointer = next(oldStylePointers, None)
+        if firstPointer is not None:
+            runsGraph = self.getRunsGraph()
             # Fix the protocol parameters
-            for pointer in oldStylePointerList:
+            for pointer in itertools.chain([firstPointer], oldStylePointers):
                 auxPointer = pointer.getObjValue()
-                pointer.set(self.getRunsGraph().getNode(str(pointer.get().getObjParentId())).run)
+                pointer.set(runsGraph.getNode(str(pointer.get().getObjParentId())).run)
                 pointer.setExtended(auxPointer.getLastName())
-                protocol._store()
-                self._storeProtocol(protocol)
-                self._updateProtocol(protocol)
-                self.mapper.commit()
+            # Store all the fixed pointers at once
+            protocol._store()
+            self._storeProtocol(protocol)
+            self._updateProtocol(protocol)
+            self.mapper.commit()
 
     def stopWorkFlow(self, activeProtList):
         """
@@ -580,7 +651,7 @@ class Project(object):
         isRestart = protocol.getRunMode() == MODE_RESTART
 
         if not force:
-            if (not protocol.isInteractive() and not protocol.isInStreaming()) or isRestart:
+            if isRestart or not (protocol.isInteractive() or protocol.isInStreaming()):
                 self._checkModificationAllowed([protocol],
                                                'Cannot RE-LAUNCH protocol')
 
@@ -600,7 +671,7 @@ class Project(object):
 
             # NOTE: now we are simply copying the entire project db, this can be
             # changed later to only create a subset of the db need for the run
-            pwutils.path.copyFile(self.dbPath, protocol.getDbPath())
+            self._snapshotDbForRun(protocol)
 
         # Launch the protocol, the jobId should be set after this call
         jobId = pwprot.launch(protocol, wait)
@@ -640,93 +711,134 @@ class Project(object):
         # Prepare a separate db for this run
         # NOTE: now we are simply copying the entire project db, this can be
         # changed later to only create a subset of the db need for the run
-        pwutils.path.copyFile(self.dbPath, protocol.getDbPath())
+        self._snapshotDbForRun(protocol)
         # Launch the protocol, the jobId should be set after this call
         pwprot.schedule(protocol, initialSleepTime=initialSleepTime)
         self.mapper.store(protocol)
         self.mapper.commit()
 
+    def _snapshotDbForRun(self, protocol):
+        """ Write a copy of the project db into the protocol run db.
+        Use the sqlite online backup from the already open connection
+        when available (python >= 3.7), otherwise copy the file.
+        """
+        connection = self.mapper.db.connection
+
+        if hasattr(connection, 'backup'):
+            start = time.time()
+
+            def _checkTimeout(status, remaining, total):
+                # backup() keeps retrying while any of the dbs is locked
+                if time.time() - start > SNAPSHOT_TIMEOUT:
+                    raise sqlite3.OperationalError("timeout after %s seconds"
+                                                   % SNAPSHOT_TIMEOUT)
+            # The project connection waits a long time on locks, limit it
+            # while backing up so each backup step returns to _checkTimeout
+            busyTimeout = connection.execute("PRAGMA busy_timeout").fetchone()[0]
+            connection.execute("PRAGMA busy_timeout = %d"
+                               % (SNAPSHOT_TIMEOUT * 1000))
+            runDb = None
+            try:
+                runDb = sqlite3.connect(protocol.getDbPath(),
+                                        timeout=SNAPSHOT_TIMEOUT)
+                connection.backup(runDb, pages=SNAPSHOT_PAGES,
+                                  progress=_checkTimeout)
+                return
+            except sqlite3.Error as e:
+                logger.warning("Could not back up the project db into %s (%s),"
+                               " copying the file instead."
+                               % (protocol.getDbPath(), e))
+            finally:
+                if runDb is not None:
+                    runDb.close()
+                connection.execute("PRAGMA busy_timeout = %d" % busyTimeout)
+
+        pwutils.path.copyFile(self.dbPath, protocol.getDbPath())
+
     def _updateProtocol(self, protocol, tries=0, checkPid=False,
-                        skipUpdatedProtocols=True):
+                        skipUpdatedProtocols=True, alivePids=None):
 
         # If this is read only exit
         if self.openedAsReadOnly():
             return pw.NOT_UPDATED_READ_ONLY
 
-        try:
-
-            # Backup the values of 'jobId', 'label' and 'comment'
-            # to be restored after the .copy
-            jobId = protocol.getJobId()
-            label = protocol.getObjLabel()
-            comment = protocol.getObjComment()
-
-            if skipUpdatedProtocols:
-                # If we are already updated, comparing timestamps
-                if pwprot.isProtocolUpToDate(protocol):
-                    return pw.NOT_UPDATED_UNNECESSARY
-
-
-            # If the protocol database has ....
-            #  Comparing date will not work unless we have a reliable
-            # lastModificationDate of a protocol in the project.sqlite
-            # TODO: when launching remote protocols, the db should be
-            # TODO: retrieved in a different way.
-            prot2 = pwprot.getProtocolFromDb(self.path,
-                                             protocol.getDbPath(),
-                                             protocol.getObjId())
-
-            # Capture the db timestamp before loading.
-            lastUpdateTime = pwutils.getFileLastModificationDate(protocol.getDbPath())
-
-            # Copy is only working for db restored objects
-            protocol.setMapper(self.mapper)
-
-            localOutputs = list(protocol._outputs)
-            protocol.copy(prot2, copyId=False, excludeInputs=True)
-
-            # merge outputs: This is necessary when outputs are added from the GUI
-            # e.g.: adding coordinates from analyze result and protocol is active (interactive).
-            for attr in localOutputs:
-                if attr not in protocol._outputs:
-                    protocol._outputs.append(attr)
-
-            # Restore backup values
-            protocol.setJobId(jobId)
-            protocol.setObjLabel(label)
-            protocol.setObjComment(comment)
-            # Use the run.db timestamp instead of the system TS to prevent
-            # possible inconsistencies.
-            protocol.lastUpdateTimeStamp.set(lastUpdateTime)
-
-            # Check pid at the end, once updated
-            if checkPid:
-                self.checkPid(protocol)
-
-
-            self.mapper.store(protocol)
-
-            # Close DB connections
-            prot2.getProject().closeMapper()
-            prot2.closeMappers()
-
-        except Exception as ex:
-            if tries == 3:  # 3 tries have been failed
-                traceback.print_exc()
-                # If any problem happens, the protocol will be marked
-                # with a FAILED status
-                try:
-                    protocol.setFailed(str(ex))
-                    self.mapper.store(protocol)
-                except Exception:
-                    pass
-                return pw.NOT_UPDATED_ERROR
-            else:
-                logger.warning("Couldn't update protocol %s(jobId=%s) from it's own database. ERROR: %s, attempt=%d"
-                             % (protocol.getObjName(), jobId, ex, tries))
-                time.sleep(0.5)
-                self._updateProtocol(protocol, tries + 1)
+        # Backup the values of 'jobId', 'label' and 'comment'
+        # to be restored after the .copy
+        jobId = protocol.getJobId()
+        label = protocol.getObjLabel()
+        comment = protocol.getObjComment()
+        dbPath = protocol.getDbPath()
 
+        # Retry a few times, the run db could be locked by the running protocol
+        for attempt in range(tries, 4):
+            try:
+                # Capture the db timestamp before loading.
+                lastUpdateTime = pwutils.getFileLastModificationDate(dbPath)
+
+                if skipUpdatedProtocols:
+                    # If we are already updated, comparing timestamps
+                    if pwprot.isProtocolUpToDate(protocol, dbTS=lastUpdateTime):
+                        return pw.NOT_UPDATED_UNNECESSARY
+
+
+                # If the protocol database has ....
+                #  Comparing date will not work unless we have a reliable
+                # lastModificationDate of a protocol in the project.sqlite
+                # TODO: when launching remote protocols, the db should be
+                # TODO: retrieved in a different way.
+                prot2 = pwprot.getProtocolFromDb(self.path,
+                                                 dbPath,
+                                                 protocol.getObjId())
+
+                # Copy is only working for db restored objects
+                protocol.setMapper(self.mapper)
+
+                localOutputs = list(protocol._outputs)
+                protocol.copy(prot2, copyId=False, excludeInputs=True)
+
+                # merge outputs: This is necessary when outputs are added from the GUI
+                # e.g.: adding coordinates from analyze result and protocol is active (interactive).
+                for attr in localOutputs:
+                    if attr not in protocol._outputs:
+                        protocol._outputs.append(attr)
+
+                # Restore backup values
+                protocol.setJobId(jobId)
+                protocol.setObjLabel(label)
+                protocol.setObjComment(comment)
+                # Use the run.db timestamp instead of the system TS to prevent
+                # possible inconsistencies.
+                protocol.lastUpdateTimeStamp.set(lastUpdateTime)
+
+                # Check pid at the end, once updated
+                if checkPid:
+                    self.checkPid(protocol, alivePids)
+
+
+                self.mapper.store(protocol)
+
+                # Close DB connections
+                prot2.getProject().closeMapper()
+                prot2.closeMappers()
+
+                break
+
+            except Exception as ex:
+                if attempt == 3:  # 3 tries have been failed
+                    logger.exception("Couldn't update protocol %s after %d attempts.",
+                                     protocol.getObjName(), attempt + 1)
+                    # If any problem happens, the protocol will be marked
+                    # with a FAILED status
+                    try:
+                        protocol.setFailed(str(ex))
+                        self.mapper.store(protocol)
+                    except Exception:
+                        pass
+                    return pw.NOT_UPDATED_ERROR
+                else:
+                    logger.warning("Couldn't update protocol %s(jobId=%s) from it's own database. ERROR: %s, attempt=%d"
+                                 % (protocol.getObjName(), jobId, ex, attempt))
+                    time.sleep(0.5)
 
         return pw.PROTOCOL_UPDATED
 
@@ -755,10 +867,9 @@ class Project(object):
         finally:
             protocol.setSaved()
             protocol.runMode.set(MODE_RESTART)
-            protocol._store()
-            self._storeProtocol(protocol)
             protocol.makePathsAndClean()  # Create working dir if necessary
-            protocol._store()
+            # Store once, this also commits the outputs and relations
+            # deleted by makePathsAndClean through the project mapper
             self._storeProtocol(protocol)
 
     def continueProtocol(self, protocol):
@@ -769,28 +880,19 @@ class Project(object):
         protocol.continueFromInteractive()
         self.launchProtocol(protocol)
 
-    def __protocolInList(self, prot, protocols):
-        """ Check if a protocol is in a list comparing the ids. """
-        for p in protocols:
-            if p.getObjId() == prot.getObjId():
-                return True
-        return False
-
-    def __validDependency(self, prot, child, protocols):
-        """ Check if the given child is a true dependency of the protocol
-        in order to avoid any modification.
-        """
-        return (not self.__protocolInList(child, protocols) and
-                not child.isSaved() and not child.isScheduled())
-
     def _getProtocolsDependencies(self, protocols):
         error = ''
         runsGraph = self.getRunsGraph()
+        protocolIds = {p.getObjId() for p in protocols}
         for prot in protocols:
-            node = runsGraph.getNode(prot.strId())
+            node = runsGraph.getNode(prot.getObjId())
             if node:
-                childs = [node.run for node in node.getChilds() if
-                          self.__validDependency(prot, node.run, protocols)]
+                # A child is a true dependency, that prevents any modification,
+                # if it is not being modified too and it is not just saved
+                # or scheduled
+                childs = [c.run for c in node.getChilds()
+                          if c.run.getObjId() not in protocolIds
+                          and not c.run.isSaved() and not c.run.isScheduled()]
                 if childs:
                     deps = [' ' + c.getRunName() for c in childs]
                     error += '\n *%s* is referenced from:\n   - ' % prot.getRunName()
@@ -827,39 +929,58 @@ class Project(object):
         """
         activeProtList = []
         configuredProtList = {}
-        auxProtList = []
         # store the protocol and your level into the workflow
         configuredProtList[protocol.getObjId()] = [protocol, 0]
-        auxProtList.append(protocol.getObjId())
         runGraph = self.getRunsGraph()
-
-        while auxProtList:
-            protocol = runGraph.getNode(str(auxProtList.pop(0))).run
+        startNode = runGraph.getNode(protocol.getObjId())
+
+        # Count how many parents of each node are inside the workflow
+        parentsCount = {startNode.getName(): 0}
+        auxNodeList = deque([startNode])
+        while auxNodeList:
+            node = auxNodeList.popleft()
+            for child in node.getChilds():
+                childName = child.getName()
+                if childName in parentsCount:
+                    parentsCount[childName] += 1
+                else:
+                    parentsCount[childName] = 1
+                    auxNodeList.append(child)
+
+        # Visit the nodes in topological order, so each protocol is only
+        # processed once, after the final level of all its parents is known
+        auxNodeList.append(startNode)
+        while auxNodeList:
+            node = auxNodeList.popleft()
+            protocol = node.run
             level = configuredProtList[protocol.getObjId()][1] + 1
             if fixProtParam:
                 self._fixProtParamsConfiguration(protocol)
             if protocol.isActive() and protocol.getStatus() != STATUS_INTERACTIVE:
                 activeProtList.append(protocol)
-            node = runGraph.getNode(protocol.strId())
-            dependencies = [node.run for node in node.getChilds()]
-            for dep in dependencies:
-                if not dep.getObjId() in auxProtList:
-                    auxProtList.append(dep.getObjId())
-                if not dep.getObjId() in configuredProtList.keys():
+            for child in node.getChilds():
+                dep = child.run
+                if dep.getObjId() not in configuredProtList:
                     configuredProtList[dep.getObjId()] = [dep, level]
                 elif level > configuredProtList[dep.getObjId()][1]:
                     configuredProtList[dep.getObjId()][1] = level
+                parentsCount[child.getName()] -= 1
+                if parentsCount[child.getName()] == 0:
+                    auxNodeList.append(child)
 
         return configuredProtList, activeProtList
 
     def deleteProtocol(self, *protocols):
         self._checkModificationAllowed(protocols, 'Cannot DELETE protocols')
 
+        # Delete the relations created by the protocols and then
+        # the protocols themselves from the database
+        self.mapper.deleteRelationsMany(protocols)
+        self.mapper.deleteMany(protocols)
+        self.mapper.commit()
+        self._removeRunLabels(protocols)
+
         for prot in protocols:
-            # Delete the relations created by this protocol
-            self.mapper.deleteRelations(prot)
-            # Delete from protocol from database
-            self.mapper.delete(prot)
             wd = prot.workingDir.get()
 
             if wd.startswith(PROJECT_RUNS):
@@ -867,13 +988,11 @@ class Project(object):
             else:
                 logger.info("Can't delete protocol %s. Its workingDir %s does not starts with %s " % (prot, wd, PROJECT_RUNS))
 
-        self.mapper.commit()
-
     def deleteProtocolOutput(self, protocol, output):
         """ Delete a given object from the project.
         Usually to clean up some outputs.
         """
-        node = self.getRunsGraph().getNode(protocol.strId())
+        node = self.getRunsGraph().getNode(protocol.getObjId())
         deps = []
 
         for node in node.getChilds():
@@ -891,7 +1010,7 @@ class Project(object):
             raise Exception(error)
         else:
             protocol.deleteOutput(output)
-            pwutils.path.copyFile(self.dbPath, protocol.getDbPath())
+            self._snapshotDbForRun(protocol)
 
     def __setProtocolLabel(self, newProt):
         """ Set a readable label to a newly created protocol.
@@ -899,19 +1018,11 @@ class Project(object):
         and then use an incremental labeling in parenthesis (<number>++)
         """
         defaultLabel = newProt.getClassLabel()
-        maxSuffix = 0
-
-        for prot in self.getRuns(iterate=True, refresh=False):
-            otherProtLabel = prot.getObjLabel()
-            m = REGEX_NUMBER_ENDING.match(otherProtLabel)
-            if m and m.groupdict()['prefix'].strip() == defaultLabel:
-                stringSuffix = m.groupdict()['number'].strip('(').strip(')')
-                try:
-                    maxSuffix = max(int(stringSuffix), maxSuffix)
-                except:
-                    logger.error("Couldn't set protocol's label. %s" % stringSuffix)
-            elif otherProtLabel == defaultLabel:  # When only we have the prefix,
-                maxSuffix = max(1, maxSuffix)     # this REGEX don't match.
+        labels, numbered, _ = self._getRunLabelSuffixes()
+        maxSuffix = numbered.get(defaultLabel, 0)
+
+        if defaultLabel in labels:  # When only we have the prefix,
+            maxSuffix = max(1, maxSuffix)  # this REGEX don't match.
 
         if maxSuffix:
             protLabel = '%s (%d)' % (defaultLabel, maxSuffix+1)
@@ -920,6 +1031,80 @@ class Project(object):
 
         newProt.setObjLabel(protLabel)
 
+    def _getRunLabelSuffixes(self):
+        """ Scan the labels of the runs once to propose new labels.
+        Return the set of labels, a dict with the max (<number>) suffix
+        by label prefix and a dict with the max (copy <number>) suffix
+        by copy prefix. The labels are kept until the runs are reloaded
+        and updated when protocols are stored or deleted.
+        """
+        runs = self.getRuns(iterate=True, refresh=False)
+
+        if self._runLabels is None:
+            self._runLabels = {prot.getObjId(): prot.getObjLabel()
+                               for prot in runs}
+            self._runLabelSuffixes = None
+
+        if self._runLabelSuffixes is None:
+            self._runLabelSuffixes = set(), {}, {}
+
+            for label in self._runLabels.values():
+                self._addLabelSuffix(label)
+
+        return self._runLabelSuffixes
+
+    def _addRunLabel(self, protocol):
+        """ Update the cached run labels, if any, with the label
+        of a stored protocol. """
+        if self._runLabels is None:
+            return
+
+        label = protocol.getObjLabel()
+        oldLabel = self._runLabels.get(protocol.getObjId())
+        self._runLabels[protocol.getObjId()] = label
+
+        if oldLabel is None:
+            self._addLabelSuffix(label)
+        elif oldLabel != label:
+            # Renamed, the old label may hold the max suffixes
+            self._runLabelSuffixes = None
+
+    def _removeRunLabels(self, protocols):
+        """ Remove the labels of deleted protocols from the cache. """
+        if self._runLabels is None:
+            return
+
+        for prot in protocols:
+            self._runLabels.pop(prot.getObjId(), None)
+        self._runLabelSuffixes = None
+
+    def _addLabelSuffix(self, label):
+        """ Add a label to the cached label suffixes, if any. """
+        if self._runLabelSuffixes is None:
+            return
+
+        labels, numbered, copies = self._runLabelSuffixes
+        labels.add(label)
+        m = REGEX_NUMBER_ENDING.fullmatch(label)
+        if m:
+            prefix = m.group('prefix').strip()
+            stringSuffix = m.group('number')
+            try:
+                numbered[prefix] = max(int(stringSuffix),
+                                       numbered.get(prefix, 0))
+            except ValueError:
+                logger.error("Couldn't set protocol's label. %s" % stringSuffix)
+
+        mOther = REGEX_NUMBER_ENDING_CP.fullmatch(label)
+        if mOther:
+            prefix = mOther.group('prefix')
+            stringSuffix = mOther.group('number') or 1
+            try:
+                copies[prefix] = max(int(stringSuffix),
+                                     copies.get(prefix, 0))
+            except ValueError:
+                logger.error("Couldn't set protocol's label. %s" % stringSuffix)
+
     def newProtocol(self, protocolClass, **kwargs):
         """ Create a new protocol from a given class. """
         newProt = protocolClass(project=self, **kwargs)
@@ -939,6 +1124,7 @@ class Project(object):
         Used from self.copyProtocol
         """
         matches = []
+        outputKeys = None  # Output keys by object id, only built if needed
         for iKey, iAttr in childNode.run.iterInputAttributes():
             # As this point iAttr should be always a Pointer that 
             # points to the output of other protocol
@@ -946,12 +1132,17 @@ class Project(object):
                 oKey = iAttr.getExtended()
                 matches.append((oKey, iKey))
             else:
-                for oKey, oAttr in node.run.iterOutputAttributes():
-                    # If node output is "real" and iAttr is still just a pointer
-                    # the iAttr.get() will return None
-                    pointed = iAttr.get()
-                    if pointed is not None and oAttr.getObjId() == pointed.getObjId():
-                        matches.append((oKey, iKey))
+                # If node output is "real" and iAttr is still just a pointer
+                # the iAttr.get() will return None
+                pointed = iAttr.get()
+                if pointed is None:
+                    continue
+                if outputKeys is None:
+                    outputKeys = {}
+                    for oKey, oAttr in node.run.iterOutputAttributes():
+                        outputKeys.setdefault(oAttr.getObjId(), []).append(oKey)
+                for oKey in outputKeys.get(pointed.getObjId(), []):
+                    matches.append((oKey, iKey))
 
         return matches
 
@@ -962,17 +1153,16 @@ class Project(object):
         """
         newProt = self.newProtocol(protocol.getClass())
         oldProtName = protocol.getRunName()
-        maxSuffix = 0
 
         # if '(copy...' suffix is not in the old name, we add it in the new name
         # and setting the newnumber
-        mOld = REGEX_NUMBER_ENDING_CP.match(oldProtName)
+        mOld = REGEX_NUMBER_ENDING_CP.fullmatch(oldProtName)
         if mOld:
-            newProtPrefix = mOld.groupdict()['prefix']
-            if mOld.groupdict()['number'] == '':
+            newProtPrefix = mOld.group('prefix')
+            if mOld.group('number') == '':
                 oldNumber = 1
             else:
-                oldNumber = int(mOld.groupdict()['number'])
+                oldNumber = int(mOld.group('number'))
         else:
             newProtPrefix = oldProtName + ' (copy'
             oldNumber = 0
@@ -980,16 +1170,10 @@ class Project(object):
 
         # looking for "<old name> (copy" prefixes in the project and
         # setting the newNumber as the maximum+1
-        for prot in self.getRuns(iterate=True, refresh=False):
-            otherProtLabel = prot.getObjLabel()
-            mOther = REGEX_NUMBER_ENDING_CP.match(otherProtLabel)
-            if mOther and mOther.groupdict()['prefix'] == newProtPrefix:
-                stringSuffix = mOther.groupdict()['number']
-                if stringSuffix == '':
-                    stringSuffix = 1
-                maxSuffix = max(maxSuffix, int(stringSuffix))
-                if newNumber <= maxSuffix:
-                    newNumber = maxSuffix + 1
+        _, _, copies = self._getRunLabelSuffixes()
+        maxSuffix = copies.get(newProtPrefix, 0)
+        if newNumber <= maxSuffix:
+            newNumber = maxSuffix + 1
 
         # building the new name
         if newNumber == 1:
@@ -1020,12 +1204,15 @@ class Project(object):
             for prot in protocol:
                 newProt = self.__cloneProtocol(prot)
                 newDict[prot.getObjId()] = newProt
-                self.saveProtocol(newProt)
+                # Committed once all references are updated
+                self.saveProtocol(newProt, commit=False)
 
             g = self.getRunsGraph()
+            # Pointers of the copied PointerLists by the id they point to
+            pointerListIndex = {}
 
             for prot in protocol:
-                node = g.getNode(prot.strId())
+                node = g.getNode(prot.getObjId())
                 newProt = newDict[prot.getObjId()]
 
                 for childNode in node.getChilds():
@@ -1047,9 +1234,13 @@ class Project(object):
                               childPointer = childPointer.getPointer()
 
                             elif isinstance(childPointer, pwobj.PointerList):
-                                for p in childPointer:
-                                    if p.getObjValue().getObjId() == prot.getObjId():
-                                        childPointer = p
+                                indexKey = (childNode.run.getObjId(), iKey)
+                                if indexKey not in pointerListIndex:
+                                    pointerListIndex[indexKey] = {
+                                        p.getObjValue().getObjId(): p
+                                        for p in childPointer}
+                                childPointer = pointerListIndex[indexKey].get(
+                                    prot.getObjId(), childPointer)
                             childPointer.set(newProt)
                             childPointer.setExtended(oKey)
                         self.mapper.store(newChildProt)
@@ -1076,7 +1267,7 @@ class Project(object):
 
         # Handle the copy of a list of protocols
         # for this case we need to update the references of input/outputs
-        newDict = OrderedDict()
+        newDict = {}
 
         for prot in protocols:
             newDict[prot.getObjId()] = prot.getDefinitionDict()
@@ -1085,7 +1276,7 @@ class Project(object):
 
         for prot in protocols:
             protId = prot.getObjId()
-            node = g.getNode(prot.strId())
+            node = g.getNode(protId)
 
             for childNode in node.getChilds():
                 childId = childNode.run.getObjId()
@@ -1118,6 +1309,19 @@ class Project(object):
         return json.dumps(list(newDict.values()),
                           indent=4, separators=(',', ': '))
 
+    def writeProtocolsJson(self, protocols, fileObj):
+        """
+        Same as getProtocolsJson but writing the json to an open file
+        as it is encoded, without building the whole string in memory.
+
+        :param protocols: list of protocols or None to include all.
+        :param fileObj: a file object open for writing.
+
+        """
+        newDict = self.getProtocolsDict(protocols=protocols)
+        json.dump(list(newDict.values()), fileObj,
+                  indent=4, separators=(',', ': '))
+
     def exportProtocols(self, protocols, filename):
         """ Create a text json file with the info
         to import the workflow into another project.
@@ -1127,10 +1331,8 @@ class Project(object):
         :param filename: the filename where to write the workflow.
 
         """
-        jsonStr = self.getProtocolsJson(protocols)
-        f = open(filename, 'w')
-        f.write(jsonStr)
-        f.close()
+        with open(filename, 'w') as f:
+            self.writeProtocolsJson(protocols, f)
 
     def loadProtocols(self, filename=None, jsonStr=None):
         """ Load protocols generated in the same format as self.exportProtocols.
@@ -1141,17 +1343,21 @@ class Project(object):
         Note: either filename or jsonStr should be not None.
 
         """
-        f = open(filename)
         importDir = os.path.dirname(filename)
-        protocolsList = json.load(f)
+        with open(filename) as f:
+            protocolsList = json.load(f)
+
+        # Index the exported dicts by their original id, used in
+        # both passes below
+        protDictById = {protDict['object.id']: protDict
+                        for protDict in protocolsList}
 
         emProtocols = self._domain.getProtocols()
-        newDict = OrderedDict()
+        newDict = {}
 
         # First iteration: create all protocols and setup parameters
-        for i, protDict in enumerate(protocolsList):
+        for protId, protDict in protDictById.items():
             protClassName = protDict['object.className']
-            protId = protDict['object.id']
             protClass = emProtocols.get(protClassName, None)
 
             if protClass is None:
@@ -1161,14 +1367,15 @@ class Project(object):
                 prot = self.newProtocol(protClass,
                                         objLabel=protLabel,
                                         objComment=protDict.get('object.comment', None))
-                protocolsList[i] = prot.processImportDict(protDict, importDir)
+                protDictById[protId] = prot.processImportDict(protDict, importDir)
 
                 prot._useQueue.set(protDict.get('_useQueue', False))
                 prot._queueParams.set(protDict.get('_queueParams', None))
                 prot._prerequisites.set(protDict.get('_prerequisites', None))
                 prot.forceSchedule.set(protDict.get('forceSchedule', False))
                 newDict[protId] = prot
-                self.saveProtocol(prot)
+                # Committed once all protocols are loaded
+                self.saveProtocol(prot, commit=False)
 
         # Second iteration: update pointers values
         def _setPointer(pointer, value):
@@ -1176,11 +1383,11 @@ class Project(object):
             # id is already present in the dictionary
             # Value to pointers could be None: Partial workflows
             if value:
-                parts = value.split('.')
-                target = newDict.get(parts[0], None)
+                targetId, _, extended = value.partition('.')
+                target = newDict.get(targetId, None)
                 pointer.set(target)
                 if not pointer.pointsNone():
-                    pointer.setExtendedParts(parts[1:])
+                    pointer.setExtended(extended)
 
         def _setPrerequisites(prot):
             prerequisites = prot.getPrerequisites()
@@ -1194,48 +1401,50 @@ class Project(object):
                         logger.info('"Wait for" id %s missing: ignored.' % prerequisite)
                 prot._prerequisites.set(newPrerequisites)
 
-        for protDict in protocolsList:
-            protId = protDict['object.id']
-
-            if protId in newDict:
-                prot = newDict[protId]
-                _setPrerequisites(prot)
-                for paramName, attr in prot.iterDefinitionAttributes():
-                    if paramName in protDict:
-                        # If the attribute is a pointer, we should look
-                        # if the id is already in the dictionary and 
-                        # set the extended property
-                        if attr.isPointer():
-                            _setPointer(attr, protDict[paramName])
-                        # This case is similar to Pointer, but the values
-                        # is a list and we will setup a pointer for each value
-                        elif isinstance(attr, pwobj.PointerList):
-                            attribute = protDict[paramName]
-                            if attribute is None:
-                                continue
-                            for value in attribute:
-                                p = pwobj.Pointer()
-                                _setPointer(p, value)
-                                attr.append(p)
-                        # For "normal" parameters we just set the string value
-                        else:
-                            try:
-                                attr.set(protDict[paramName])
-                            # Case for Scalars with pointers. So far this will work for Numbers. With Strings (still there are no current examples)
-                            # We will need something different to test if the value look like a pointer: regex? ####.text
-                            except ValueError as e:
-                                newPointer = pwobj.Pointer()
-                                _setPointer(newPointer, protDict[paramName])
-                                attr.setPointer(newPointer)
-
-                self.mapper.store(prot)
-
-        f.close()
+        for protId, prot in newDict.items():
+            protDict = protDictById[protId]
+            _setPrerequisites(prot)
+            for paramName, attr in prot.iterDefinitionAttributes():
+                if paramName in protDict:
+                    # If the attribute is a pointer, we should look
+                    # if the id is already in the dictionary and 
+                    # set the extended property
+                    if attr.isPointer():
+                        _setPointer(attr, protDict[paramName])
+                    # This case is similar to Pointer, but the values
+                    # is a list and we will setup a pointer for each value
+                    elif isinstance(attr, pwobj.PointerList):
+                        attribute = protDict[paramName]
+                        if attribute is None:
+                            continue
+                        for value in attribute:
+                            p = pwobj.Pointer()
+                            _setPointer(p, value)
+                            attr.append(p)
+                    # For "normal" parameters we just set the string value
+                    else:
+                        try:
+                            attr.set(protDict[paramName])
+                        # Case for Scalars with pointers. So far this will work for Numbers. With Strings (still there are no current examples)
+                        # We will need something different to test if the value look like a pointer: regex? ####.text
+                        except ValueError as e:
+                            newPointer = pwobj.Pointer()
+                            _setPointer(newPointer, protDict[paramName])
+                            attr.setPointer(newPointer)
+
+            self.mapper.store(prot)
+
         self.mapper.commit()
 
         return newDict
 
-    def saveProtocol(self, protocol):
+    def saveProtocol(self, protocol, commit=True):
+        """ Save the protocol in the project db.
+
+        :param protocol: protocol to be saved.
+        :param commit: If False, the caller is responsible for committing
+            the mapper, useful when saving several protocols at once.
+        """
         self._checkModificationAllowed([protocol], 'Cannot SAVE protocol')
 
         if (protocol.isRunning() or protocol.isFinished()
@@ -1245,9 +1454,9 @@ class Project(object):
 
         protocol.setStatus(pwprot.STATUS_SAVED)
         if protocol.hasObjId():
-            self._storeProtocol(protocol)
+            self._storeProtocol(protocol, commit=commit)
         else:
-            self._setupProtocol(protocol)
+            self._setupProtocol(protocol, commit=commit)
 
     def getProtocol(self, protId):
         protocol = self.mapper.selectById(protId)
@@ -1281,11 +1490,13 @@ class Project(object):
         hostConfig = self.getHostConfig(hostName)
         protocol.setHostConfig(hostConfig)
 
-    def _storeProtocol(self, protocol):
+    def _storeProtocol(self, protocol, commit=True):
         # Read only mode
         if not self.openedAsReadOnly():
             self.mapper.store(protocol)
-            self.mapper.commit()
+            if commit:
+                self.mapper.commit()
+            self._addRunLabel(protocol)
 
     def _setProtocolMapper(self, protocol):
         """ Set the project and mapper to the protocol. """
@@ -1305,19 +1516,19 @@ class Project(object):
                 "*Protocol loading problem*: A set related to this "
                 "protocol couldn't be loaded.")
 
-    def _setupProtocol(self, protocol):
+    def _setupProtocol(self, protocol, commit=True):
         """Insert a new protocol instance in the database"""
 
         # Read only mode
         if not self.openedAsReadOnly():
-            self._storeProtocol(protocol)  # Store first to get a proper id
+            self.mapper.store(protocol)  # Store first to get a proper id
             # Set important properties of the protocol
             workingDir = self.getProtWorkingDir(protocol)
             self._setProtocolMapper(protocol)
 
             protocol.setWorkingDir(self.getPath(PROJECT_RUNS, workingDir))
             # Update with changes
-            self._storeProtocol(protocol)
+            self._storeProtocol(protocol, commit=commit)
 
     @staticmethod
     def getProtWorkingDir(protocol):
@@ -1342,6 +1553,10 @@ class Project(object):
 
             # Invalidate _runsGraph because the runs are updated
             self._runsGraph = None
+            self._runLabels = None
+            self._runLabelSuffixes = None
+            # Scan running processes once for all the runs
+            alivePids = pwutils.getAlivePids() if checkPids else None
 
             for r in self.runs:
 
@@ -1354,7 +1569,8 @@ class Project(object):
                 # by other protocols
                 if r.isActive():
                     if not r.isChild():
-                        self._updateProtocol(r, checkPid=checkPids)
+                        self._updateProtocol(r, checkPid=checkPids,
+                                             alivePids=alivePids)
 
                 self._annotateLastRunTime(r.endTime)
 
@@ -1386,10 +1602,15 @@ class Project(object):
                     return True
         return False
 
-    def checkPid(self, protocol):
+    def checkPid(self, protocol, alivePids=None):
         """ Check if a running protocol is still alive or not.
         The check will only be done for protocols that have not been sent
         to a queue system.
+
+        :param protocol: protocol to check.
+        :param alivePids: optional set with the pids alive in the machine
+            (see pwutils.getAlivePids). Pids found there are not checked
+            again, the rest are, since they may have started after the scan.
         """
         from pyworkflow.protocol.launch import _runsLocally
         pid = protocol.getPid()
@@ -1403,6 +1624,7 @@ class Project(object):
         # which PID is gone.
         if (protocol.isActive() and not protocol.isInteractive() and _runsLocally(protocol)
             and not protocol.useQueue()
+                and not (alivePids is not None and pid in alivePids)
                 and not pwutils.isProcessAlive(pid)):
             protocol.setFailed("Process %s not found running on the machine. "
                                "It probably has died or been killed without "
@@ -1444,11 +1666,15 @@ class Project(object):
 
         """
         outputDict = {}  # Store the output dict
+        runNodes = []  # Store (run, node) pairs to avoid looking them up again
         g = pwutils.Graph(rootName='PROJECT')
 
         for r in runs:
             n = g.createNode(r.strId())
+            # Also register the integer id to skip str() in internal lookups
+            g.aliasNode(n, r.getObjId())
             n.run = r
+            runNodes.append((r, n))
             n.setLabel(r.getRunName())
             outputDict[r.getObjId()] = n
             for _, attr in r.iterOutputAttributes():
@@ -1470,16 +1696,29 @@ class Project(object):
                         return True
             return False
 
-        for r in runs:
-            node = g.getNode(r.strId())
+        inputs = []  # (node, pointed object) of the inputs with value
+        for r, node in runNodes:
             for _, attr in r.iterInputAttributes():
-                if attr.hasValue():
-                    pointed = attr.getObjValue()
-                    # Only checking pointed object and its parent, if more
-                    # levels we need to go up to get the correct dependencies
-                    if not _checkInputAttr(node, pointed):
-                        parent = self.mapper.getParent(pointed)
-                        _checkInputAttr(node, parent)
+                # Same as attr.hasValue() for pointers, in a single call
+                pointed = attr.getObjValue()
+                if pointed is not None:
+                    inputs.append((node, pointed))
+
+        # Fetch at once the parents of the pointed objects that are not
+        # outputs of another run, they are needed as fallback below
+        parentIds = set()
+        for node, pointed in inputs:
+            if (outputDict.get(pointed.getObjId(), node) is node and
+                    pointed.getObjParentId() is not None):
+                parentIds.add(pointed.getObjParentId())
+        parents = self.mapper.selectByIds(parentIds)
+
+        for node, pointed in inputs:
+            # Only checking pointed object and its parent, if more
+            # levels we need to go up to get the correct dependencies
+            if not _checkInputAttr(node, pointed):
+                parent = parents.get(pointed.getObjParentId(), None)
+                _checkInputAttr(node, parent)
         rootNode = g.getRoot()
         rootNode.run = None
         rootNode.label = "PROJECT"
@@ -1492,7 +1731,7 @@ class Project(object):
     def _getRelationGraph(self, relation=pwobj.RELATION_SOURCE, refresh=False):
         """ Retrieve objects produced as outputs and
         make a graph taking into account the SOURCE relation. """
-        relations = self.mapper.getRelationsByName(relation)
+        relations = self.mapper.getRelationsByName(relation, refresh=refresh)
         g = pwutils.Graph(rootName='PROJECT')
         root = g.getRoot()
         root.pointer = None
@@ -1504,11 +1743,16 @@ class Project(object):
                 node = g.createNode(p.getUniqueId(), attr.getNameId())
                 node.pointer = p
                 # The following alias if for backward compatibility
-                p2 = pwobj.Pointer(attr)
-                g.aliasNode(node, p2.getUniqueId())
+                # (the unique id of a Pointer(attr) without extended)
+                g.aliasNode(node, attr.strId())
+
+        # Fetch all related objects at once instead of one query per id
+        relObjects = self.mapper.selectByIds(
+            {rel[OBJECT_PARENT_ID] for rel in relations} |
+            {rel['object_child_id'] for rel in relations})
 
         for rel in relations:
-            pObj = self.getObject(rel[OBJECT_PARENT_ID])
+            pObj = relObjects.get(rel[OBJECT_PARENT_ID], None)
 
             # Duplicated ...
             if pObj is None:
@@ -1530,15 +1774,18 @@ class Project(object):
             pid = pp.getUniqueId()
             parent = g.getNode(pid)
 
-            while not parent and pp.hasExtended():
-                pp.removeExtended()
-                parent = g.getNode(pp.getUniqueId())
+            # Fall back to the closest pointed object, dropping the last
+            # extended parts from the id (as pp.removeExtended() would do)
+            parentId = pid
+            while not parent and '.' in parentId:
+                parentId = parentId.rsplit('.', 1)[0]
+                parent = g.getNode(parentId)
 
             if not parent:
                 logger.error("project._getRelationGraph: parent Node "
                       "is None: %s" % pid)
             else:
-                cObj = self.getObject(rel['object_child_id'])
+                cObj = relObjects.get(rel['object_child_id'], None)
                 cExt = rel['object_child_extended']
 
                 if cObj is not None:
@@ -1548,11 +1795,12 @@ class Project(object):
                             cp.setExtended(cExt)
                     else:
                         cp = pwobj.Pointer(cObj, extended=cExt)
-                    child = g.getNode(cp.getUniqueId())
+                    cpId = cp.getUniqueId()
+                    child = g.getNode(cpId)
 
                     if not child:
                         logger.error("project._getRelationGraph: child Node "
-                              "is None: %s." % cp.getUniqueId())
+                              "is None: %s." % cpId)
                         logger.error("   parent: %s" % pid)
                     else:
                         parent.addChild(child)
@@ -1608,29 +1856,51 @@ class Project(object):
         """
 
         graph = self.getTransformGraph(refresh)
-        relations = self.mapper.getRelationsByName(relation)
+        relations = self.mapper.getRelationsByName(relation, refresh=refresh)
         connection = self._getConnectedObjects(obj, graph)
 
         objects = []
-        objectsDict = {}
+        seenIds = set()
 
-        for rel in relations:
-            pObj = self.getObject(rel[OBJECT_PARENT_ID])
+        def _parentUniqueId(rel):
+            # The unique id of the parent pointer only depends on the parent
+            # id and extended, no need to load the parent object from the db
+            pObj = pwobj.Object(objId=rel[OBJECT_PARENT_ID])
+            pExt = rel['object_parent_extended']
+            return pwobj.Pointer(pObj, extended=pExt).getUniqueId()
+
+        candidateRels = [rel for rel in relations
+                         if _parentUniqueId(rel) in connection]
+        # Only the connected parents are loaded, to skip deleted ones
+        candidateIds = {rel[OBJECT_PARENT_ID] for rel in candidateRels}
+        parentObjects = self.mapper.selectByIds(candidateIds)
+        connectedRels = [rel for rel in candidateRels
+                         if rel[OBJECT_PARENT_ID] in parentObjects]
+
+        # For the rest of parents just check that they exist, to warn
+        # about any relation pointing to a deleted object
+        otherIds = {rel[OBJECT_PARENT_ID] for rel in relations} - candidateIds
+        existingIds = self.mapper.existingIds(otherIds)
+        existingIds.update(parentObjects)
 
-            if pObj is None:
+        for rel in relations:
+            if rel[OBJECT_PARENT_ID] not in existingIds:
                 logger.warning("Relation seems to point to a deleted object. "
                       "%s: %s" % (OBJECT_PARENT_ID, rel[OBJECT_PARENT_ID]))
-                continue
-            pExt = rel['object_parent_extended']
-            pp = pwobj.Pointer(pObj, extended=pExt)
 
-            if pp.getUniqueId() in connection:
-                cObj = self.getObject(rel['object_child_id'])
-                cExt = rel['object_child_extended']
-                cp = pwobj.Pointer(cObj, extended=cExt)
-                if cp.hasValue() and cp.getUniqueId() not in objectsDict:
+        # Only the children of connected parents are needed
+        childObjects = self.mapper.selectByIds(
+            {rel['object_child_id'] for rel in connectedRels})
+
+        for rel in connectedRels:
+            cObj = childObjects.get(rel['object_child_id'], None)
+            cExt = rel['object_child_extended']
+            cp = pwobj.Pointer(cObj, extended=cExt)
+            if cp.hasValue():
+                cpId = cp.getUniqueId()
+                if cpId not in seenIds:
                     objects.append(cp)
-                    objectsDict[cp.getUniqueId()] = True
+                    seenIds.add(cpId)
 
         return objects
 
@@ -1646,11 +1916,18 @@ class Project(object):
         connection = {}
 
         if n is not None:
-            # Iterate recursively all descendants
-            for node in n.iterChilds():
+            # Visit all descendants once, even if they have several parents
+            visited = {n}
+            pending = deque([n])
+            while pending:
+                node = pending.popleft()
                 connection[node.pointer.getUniqueId()] = True
                 # Add also 
                 connection[node.pointer.get().strId()] = True
+                for child in node.getChilds():
+                    if child not in visited:
+                        visited.add(child)
+                        pending.append(child)
 
         return connection
 
@@ -1672,6 +1949,10 @@ class Project(object):
     def fixLinks(self, searchDir):
         logger.info("Fixing project links. Searching at %s" % searchDir)
         runs = self.getRuns()
+        # {name: path} of the files and folders under searchDir, keeping
+        # the first one found (same as pwutils.findFile), built only
+        # if there are missing files
+        searchIndex = None
 
         for prot in runs:
             print (prot)
@@ -1679,7 +1960,6 @@ class Project(object):
             if isinstance(prot, ProtImportBase) or prot.getClassName() == "ProtImportMovies":
                 logger.info("Import detected")
                 for _, attr in prot.iterOutputAttributes():
-                    fn = attr.getFiles()
                     for f in attr.getFiles():
                         if ':' in f:
                             f = f.split(':')[0]
@@ -1692,9 +1972,13 @@ class Project(object):
                             logger.info("  Missing: %s" % pwutils.magenta(f))
                             if os.path.islink(f):
                                 logger.info("    -> %s" % pwutils.red(os.path.realpath(f)))
-                            newFile = pwutils.findFile(os.path.basename(f),
-                                                       searchDir,
-                                                       recursive=True)
+                            if searchIndex is None:
+                                searchIndex = {}
+                                for root, dirs, files in os.walk(searchDir):
+                                    for name in itertools.chain(files, dirs):
+                                        searchIndex.setdefault(
+                                            name, os.path.join(root, name))
+                            newFile = searchIndex.get(os.path.basename(f), None)
                             if newFile:
                                 logger.info("  Found file %s, creating link... %s" % (newFile,
                                     pwutils.green("   %s -> %s" % (f, newFile))))
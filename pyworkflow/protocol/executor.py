@@ -51,6 +51,8 @@ class StepExecutor:
     def __init__(self, hostConfig, **kwargs):
         self.hostConfig = hostConfig
         self.gpuList = kwargs.get(cts.GPU_LIST, None)
+        # Number of leading steps known to be finished
+        self._finishedCount = 0
 
     def getGpuList(self):
         """ Return the GPU list assigned to current thread. """
@@ -67,13 +69,24 @@ class StepExecutor:
                        self.hostConfig,
                        env=env, cwd=cwd, gpuList=self.getGpuList())
         
+    def _skipFinished(self, steps):
+        """ Return the index of the first step that is not finished.
+        The leading finished steps are counted only once, so the
+        polling loops do not go through them again on every check.
+        """
+        i = min(self._finishedCount, len(steps))
+        while i < len(steps) and steps[i].isFinished():
+            i += 1
+        self._finishedCount = i
+        return i
+
     def _getRunnable(self, steps, n=1):
         """ Return the n steps that are 'new' and all its
         dependencies have been finished, or None if none ready.
         """
         rs = []  # return a list of runnable steps
 
-        for s in steps:
+        for s in steps[self._skipFinished(steps):]:
             if (s.getStatus() == cts.STATUS_NEW and
                     all(steps[i-1].isFinished() for i in s._prerequisites)):
                 rs.append(s)
@@ -85,7 +98,8 @@ class StepExecutor:
         """ Return True if there are pending steps (either running or waiting)
         that can be done and thus enable other steps to be executed.
         """
-        return any(s.isRunning() or s.isWaiting() for s in steps)
+        return any(s.isRunning() or s.isWaiting()
+                   for s in steps[self._skipFinished(steps):])
     
     def runSteps(self, steps, 
                  stepStartedCallback, 
@@ -97,6 +111,7 @@ class StepExecutor:
         # In this way we can take into account the steps graph
         # dependency and also the case when using streaming
 
+        self._finishedCount = 0  # steps may differ from a previous call
         delta = datetime.timedelta(seconds=stepsCheckSecs)
         lastCheck = datetime.datetime.now()
 
@@ -135,12 +150,21 @@ class StepExecutor:
 
 
 class StepThread(threading.Thread):
-    """ Thread to run Steps in parallel. """
-    def __init__(self, thId, step, lock):
+    """ Thread to run Steps in parallel.
+
+    :param lock: lock held while updating the step status.
+    :param finishedNodes: if given, the list where thId is added when the
+        step is done. lock must then be a threading.Condition, notified
+        to wake up the executor loop waiting on it.
+    """
+    def __init__(self, thId, step, lock, gpuList=None, finishedNodes=None):
         threading.Thread.__init__(self)
         self.thId = thId
         self.step = step
         self.lock = lock
+        self.gpuList = gpuList or []  # GPUs assigned to this thread node
+        # Shared list where the thread node is added when done
+        self.finishedNodes = finishedNodes
 
     def run(self):
         error = None
@@ -155,6 +179,10 @@ class StepThread(threading.Thread):
                     self.step.setFinished()
                 else:
                     self.step.setFailed(error)
+                if self.finishedNodes is not None:
+                    self.finishedNodes.append(self.thId)
+                    # Wake up the executor loop waiting for steps to finish
+                    self.lock.notify_all()
 
 
 
@@ -172,9 +200,14 @@ class ThreadStepExecutor(StepExecutor):
             nGpu = len(self.gpuList)
 
             if nGpu > nThreads:
-                chunk = int(nGpu / nThreads)
-                for i, node in enumerate(nodes):
-                    self.gpuDict[node] = list(self.gpuList[i*chunk:(i+1)*chunk])
+                # Consecutive chunks using all the GPUs, the first
+                # nGpu % nThreads nodes get one GPU more
+                chunk, extra = divmod(nGpu, nThreads)
+                start = 0
+                for node in nodes:
+                    end = start + chunk + (1 if node < extra else 0)
+                    self.gpuDict[node] = list(self.gpuList[start:end])
+                    start = end
             else:
                 # Expand gpuList repeating until reach nThreads items
                 if nThreads > nGpu:
@@ -187,7 +220,7 @@ class ThreadStepExecutor(StepExecutor):
     def getGpuList(self):
         """ Return the GPU list assigned to current thread
         or empty list if not using GPUs. """
-        return self.gpuDict.get(threading.currentThread().thId, [])
+        return getattr(threading.current_thread(), 'gpuList', [])
         
     def runSteps(self, steps, 
                  stepStartedCallback, 
@@ -205,20 +238,24 @@ class ThreadStepExecutor(StepExecutor):
 
         """
 
+        self._finishedCount = 0  # steps may differ from a previous call
         delta = datetime.timedelta(seconds=stepsCheckSecs)
         lastCheck = datetime.datetime.now()
 
-        sharedLock = threading.Lock()
+        # Condition (a lock) also used by the threads to notify when done
+        sharedLock = threading.Condition()
 
         runningSteps = {}  # currently running step in each node ({node: step})
         freeNodes = list(range(self.numberOfProcs))  # available nodes to send jobs
+        finishedNodes = []  # nodes whose thread is done, added by the threads
+        stepThreads = {}  # last thread started in each node ({node: thread})
 
         while True:
-            # See which of the runningSteps are not really running anymore.
+            # Take the nodes whose threads are done since the last check.
             # Update them and freeNodes, and call final callback for step.
             with sharedLock:
-                nodesFinished = [node for node, step in runningSteps.items()
-                                 if not step.isRunning()]
+                nodesFinished = list(finishedNodes)
+                finishedNodes.clear()
             doContinue = True
             for node in nodesFinished:
                 step = runningSteps.pop(node)  # remove entry from runningSteps
@@ -245,17 +282,24 @@ class ThreadStepExecutor(StepExecutor):
                         stepStartedCallback(step)
                         node = freeNodes.pop()  # take an available node
                         runningSteps[node] = step
-                        t = StepThread(node, step, sharedLock)
+                        t = StepThread(node, step, sharedLock,
+                                       self.gpuDict.get(node, []),
+                                       finishedNodes)
                         # won't keep process up if main thread ends
                         t.daemon = True
                         t.start()
+                        stepThreads[node] = t
                 anyPending = self._arePending(steps)
 
-            if not anyLaunched:
-                if anyPending:  # nothing running
-                    time.sleep(0.5)
-                else:
-                    break  # yeah, we are done, either failed or finished :)
+                if not anyLaunched and anyPending:
+                    # Wait until a thread finishes its step, unless one
+                    # already did. The timeout keeps checking the
+                    # waiting steps and the streaming callback.
+                    if not finishedNodes:
+                        sharedLock.wait(0.5)
+
+            if not anyLaunched and not anyPending:
+                break  # yeah, we are done, either failed or finished :)
 
             now = datetime.datetime.now()
             if now - lastCheck > delta:
@@ -264,16 +308,20 @@ class ThreadStepExecutor(StepExecutor):
 
         stepsCheckCallback()
 
-        # Wait for all threads now.
-        for t in threading.enumerate():
-            if t is not threading.current_thread():
-                t.join()
+        # Wait for the step threads now, previous threads of each node
+        # are already done since the node was free again.
+        for t in stepThreads.values():
+            t.join()
 
 
 class QueueStepExecutor(ThreadStepExecutor):
     def __init__(self, hostConfig, submitDict, nThreads, **kwargs):
         ThreadStepExecutor.__init__(self, hostConfig, nThreads, **kwargs)
         self.submitDict = submitDict
+        # Compiled once, it is used on every job status check
+        jobDoneRegex = hostConfig.getJobDoneRegex()
+        self._jobDoneRe = (None if jobDoneRegex is None
+                           else re.compile(jobDoneRegex))
         # Command counter per thread
         self.threadCommands = {}
         for threadId in range(nThreads):
@@ -318,18 +366,16 @@ class QueueStepExecutor(ThreadStepExecutor):
     def _checkJobStatus(self, hostConfig, jobid):
 
         command = hostConfig.getCheckCommand() % {"JOB_ID": jobid}
-        p = Popen(command, shell=True, stdout=PIPE, preexec_fn=os.setsid)
+        p = Popen(command, shell=True, stdout=PIPE, start_new_session=True)
 
         out = p.communicate()[0].decode(errors='backslashreplace')
 
-        jobDoneRegex = hostConfig.getJobDoneRegex()
-
         # If nothing is returned we assume job is no longer in queue and thus finished
         if out == "":
             return cts.STATUS_FINISHED
         # If some string is returned we use the JOB_DONE_REGEX variable (if present) to infer the status
-        elif jobDoneRegex is not None:
-            s = re.search(jobDoneRegex, out)
+        elif self._jobDoneRe is not None:
+            s = self._jobDoneRe.search(out)
             if s:
                 return cts.STATUS_FINISHED
             else:
@@ -2440,9 +2440,14 @@ def getUpdatedProtocol(protocol):
     return prot2
 
 
-def isProtocolUpToDate(protocol):
+def isProtocolUpToDate(protocol, dbTS=None):
     """ Check timestamps between protocol lastModificationDate and the
-    corresponding runs.db timestamp"""
+    corresponding runs.db timestamp
+
+    :param protocol: protocol to check.
+    :param dbTS: last modification date of the run db, if the caller
+        already has it. If None, it will be read from the file.
+    """
     if protocol is None:
         return True
 
@@ -2454,7 +2459,8 @@ def isProtocolUpToDate(protocol):
     if protTS is None:
         return False
 
-    dbTS = pwutils.getFileLastModificationDate(protocol.getDbPath())
+    if dbTS is None:
+        dbTS = pwutils.getFileLastModificationDate(protocol.getDbPath())
 
     if not (protTS and dbTS):
         logger.info("Can't compare if protocol is up to date: "
@@ -34,6 +34,7 @@ def hasLabel(TestClass, labels):
 
 class DataSet:
     _datasetDict = {}  # store all created datasets
+    _syncedSet = set()  # names of datasets already synced in this session
 
     def __init__(self, name, folder, files, url=None):
         """ 
@@ -66,11 +67,15 @@ class DataSet:
         folder = ds.folder
         url = '' if ds.url is None else ' -u ' + ds.url
 
-        if not pwutils.strToBoolean(pw.Config.SCIPION_TEST_NOSYNC):
+        # Sync each dataset only once per session, several test classes
+        # usually request the same one
+        if (name not in cls._syncedSet and
+                not pwutils.strToBoolean(pw.Config.SCIPION_TEST_NOSYNC)):
             command = ("%s %s --download %s %s"
                        % (pw.PYTHON, pw.getSyncDataScript(), folder, url))
             logger.info(">>>> %s" % command)
-            os.system(command)
+            if os.system(command) == 0:
+                cls._syncedSet.add(name)
 
         return cls._datasetDict[name]
 
@@ -29,53 +29,72 @@ to execute, in the given directory and with the given environment.
 """
 
 
+import logging
 import os
 from time import time, sleep
 from pickle import dumps, loads
 
-from pyworkflow import Config
-
 from .process import buildRunCommand, runCommand
 
 from pyworkflow.utils.utils import getLocalHostName, redStr
 
+logger = logging.getLogger(__name__)
+
 TIMEOUT = 60  # seconds trying to send/receive data through a socket
 
+# Seconds between tests of a pending request, doubled up to the maximum
+POLL_MIN_SECS = 0.01
+POLL_MAX_SECS = 1
+
 TAG_RUN_JOB = 1000
 
 
+def waitRequest(request, timeout=None):
+    """ Wait for a non-blocking request to complete and return its result.
+
+    Blocking MPI waits keep the cpu busy in most MPI implementations,
+    so the request is tested sleeping in between. The sleep starts short
+    to answer quickly to short jobs and grows for the long ones.
+    If timeout (in seconds) expires, raise TimeoutError.
+    """
+    t0 = time()
+    delay = POLL_MIN_SECS
+    while True:
+        done, result = request.test()
+        if done:
+            return result
+        if timeout is not None and time() - t0 > timeout:
+            raise TimeoutError()
+        sleep(delay)
+        delay = min(2 * delay, POLL_MAX_SECS)
+
+
 def send(command, comm, dest, tag):
     """ Send command in a non-blocking way and raise exception on error. """
 
     # This function blocks, but it uses the isend() function (which is
-    # nonblocking) and sleeps without using the cpu while we try to send.
+    # nonblocking) and waits without using the cpu while we try to send.
     # Also, if we cannot send after TIMEOUT seconds, raise exception.
 
     if command.startswith('env='):
-        print("Sending environment to %d" % dest)
+        logger.debug("Sending environment to %d", dest)
     else:
-        print("Sending command to %d: %s" % (dest, command))
+        logger.debug("Sending command to %d: %s", dest, command)
 
     # Send command with isend()
     req_send = comm.isend(dumps(command), dest=dest, tag=tag)
-    t0 = time()
-    while not req_send.test()[0]:
-        sleep(1)
-        if time() - t0 > TIMEOUT:
-            raise Exception("Timeout in process %d, cannot send command "
-                            "to worker %d." % (os.getpid(), dest))
+    try:
+        waitRequest(req_send, TIMEOUT)
+    except TimeoutError:
+        raise Exception("Timeout in process %d, cannot send command "
+                        "to worker %d." % (os.getpid(), dest))
 
     # Receive the result in a non-blocking way too (with irecv())
-    req_recv = comm.irecv(source=dest, tag=tag)
-    while True:
-        done, result = req_recv.test()
-        if done:
-            break
-        sleep(1)
+    result = waitRequest(comm.irecv(source=dest, tag=tag))
 
     if result != 0:  # result will then be a string with the error
-        print(redStr("Worker process %d has failed. Please check the terminal "
-                     "for details." % dest))
+        logger.error(redStr("Worker process %d has failed. Please check the "
+                            "terminal for details." % dest))
         raise Exception(str(result))
 
 
@@ -100,7 +119,7 @@ def runJobMPISlave(mpiComm):
     """
     rank = mpiComm.Get_rank()
     hostname = getLocalHostName()
-    print("  Running MPIWorker: ", rank)
+    logger.info("  Running MPIWorker: %d", rank)
 
     exitResult = 0
 
@@ -110,17 +129,12 @@ def runJobMPISlave(mpiComm):
     
     while True:
         # Receive command in a non-blocking way
-        req_recv = mpiComm.irecv(source=0, tag=TAG_RUN_JOB+rank)
-        while True:
-            done, command = req_recv.test()
-            if done:
-                break
-            sleep(1)
-
-        print("  Worker %s(rank %d) received command." % (hostname, rank))
+        command = waitRequest(mpiComm.irecv(source=0, tag=TAG_RUN_JOB+rank))
+
+        logger.debug("  Worker %s(rank %d) received command.", hostname, rank)
         # We need to convert to string because req_recv.test() returns bytes or None
         if command == 'None':
-            print("  Stopping...")
+            logger.info("  Stopping...")
             return
         else:
             command = loads(command)
@@ -129,29 +143,25 @@ def runJobMPISlave(mpiComm):
         try:
             if command.startswith("cwd="):
                 cwd = command.split("=", 1)[-1]
-                print("  Changing to dir %s ..." % cwd)
+                logger.debug("  Changing to dir %s ...", cwd)
             elif command.startswith("env="):
                 env = command.split("=", 1)[-1]
                 env = eval(env)
-                print("  Setting the environment...")
-                if Config.debugOn():
-                    print(env)
+                logger.debug("  Setting the environment...")
+                logger.debug("%s", env)
             else:
                 runCommand(command, cwd=cwd, env=env)
                 cwd = None  # unset directory
                 env = None  # unset environment
         except Exception as e:
-            print("  Error in process %d (rank %d)" % (os.getpid(), rank))
-            import traceback
-            traceback.print_exc()
+            logger.exception("  Error in process %d (rank %d)",
+                             os.getpid(), rank)
             exitResult = str(e)
 
         # Communicate to master, either error os success
         req_send = mpiComm.isend(exitResult, dest=0, tag=TAG_RUN_JOB+rank)
-        t0 = time()
-        while not req_send.test()[0]:
-            sleep(1)
-            if time() - t0 > TIMEOUT:
-                msg = "  Error in process %d, cannot send error message to master."
-                print(msg % os.getpid())
-                break
+        try:
+            waitRequest(req_send, TIMEOUT)
+        except TimeoutError:
+            logger.error("  Error in process %d, cannot send error message "
+                         "to master.", os.getpid())
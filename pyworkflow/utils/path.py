@@ -479,9 +479,9 @@ def getFileSize(fn):
 def getFileLastModificationDate(fn):
     """ Returns the last modification date of a file or None
     if it doesn't exist. """
-    if os.path.exists(fn):
+    try:
         ts = os.path.getmtime(fn)
-        return datetime.datetime.fromtimestamp(ts)
-    else:
+    except OSError:
         print(fn + " does not exist!!. Can't check last modification date.")
         return None
+    return datetime.datetime.fromtimestamp(ts)
@@ -31,6 +31,9 @@ This module handles process execution
 import logging
 logger = logging.getLogger(__name__)
 
+import os
+import shlex
+import shutil
 import sys
 from subprocess import check_call
 import psutil
@@ -67,9 +70,39 @@ def runCommand(command, env=None, cwd=None):
 
     # TODO: maybe have to set PBS_NODEFILE in case it is used by "command"
     # (useful for example with gnu parallel)
-    check_call(command, shell=True, stdout=sys.stdout, stderr=sys.stderr,
-               env=env, cwd=cwd)
-    # It would be nice to avoid shell=True and calling buildRunCommand()...
+    args = _splitCommand(command, env)
+    if args is None:
+        check_call(command, shell=True, stdout=sys.stdout, stderr=sys.stderr,
+                   env=env, cwd=cwd)
+    else:
+        check_call(args, stdout=sys.stdout, stderr=sys.stderr,
+                   env=env, cwd=cwd)
+
+
+# Characters that need a shell to be interpreted (pipes, redirections,
+# expansions, command lists...)
+_SHELL_CHARS = set('|&;<>()$`\\*?[]{}~#\n')
+
+
+def _splitCommand(command, env=None):
+    """ Return the list of arguments of command if it can be executed
+    without an intermediate shell, or None if it needs one.
+    """
+    if _SHELL_CHARS.intersection(command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    # Leading variable assignments and relative paths are left to the shell
+    if not args or '=' in args[0] or (os.sep in args[0]
+                                      and not os.path.isabs(args[0])):
+        return None
+    # Let the shell report programs that can not be found, as before
+    path = None if env is None else env.get('PATH', os.defpath)
+    if shutil.which(args[0], path=path) is None:
+        return None
+    return args
 
     
 def buildRunCommand(programname, params, numberOfMpi, hostConfig=None,
@@ -129,3 +162,10 @@ def isProcessAlive(pid):
         return True
     except Exception:
         return False
+
+
+def getAlivePids():
+    """ Return a set with the pids of all processes alive in the machine.
+    Useful to check many pids with a single scan of the process table.
+    """
+    return set(psutil.pids())
@@ -240,6 +240,29 @@ class TestSqliteMapper(pwtests.BaseTest):
         self.assertTrue(pwobj.Integer(4) not in iList3)
         self.assertTrue(pwobj.Integer(3) in iList3)
 
+    def test_manyIds(self):
+        """ Select and delete more objects than parameters allowed
+        in a single statement. """
+        fn = self.getOutputPath("many_ids.sqlite")
+        mapper = pwmapper.SqliteMapper(fn, pw.Config.getDomain().getMapperDict())
+        n = 2 * mapper.db.MAX_PARAMS + 10
+        objs = [pwobj.Integer(i) for i in range(n)]
+        for o in objs:
+            mapper.insert(o)
+            mapper.insertRelation('testRelation', o, o, objs[0])
+        mapper.commit()
+        ids = [o.getObjId() for o in objs]
+
+        mapper2 = pwmapper.SqliteMapper(fn, pw.Config.getDomain().getMapperDict())
+        self.assertEqual(set(ids), set(mapper2.selectByIds(ids)))
+        mapper2.deleteRelationsMany(objs)
+        mapper2.deleteMany(objs)
+        mapper2.commit()
+
+        mapper3 = pwmapper.SqliteMapper(fn, pw.Config.getDomain().getMapperDict())
+        self.assertEqual({}, mapper3.selectByIds(ids))
+        self.assertEqual([], mapper3.getRelationsByName('testRelation'))
+
 
 class TestSqliteFlatMapper(pwtests.BaseTest):
     """ Some tests for DataSet implementation. """
@@ -23,7 +23,9 @@
 # *
 # **************************************************************************
 
+import pyworkflow.tests as pwtests
 from pyworkflow.project.project import Project
+from pyworkflowtests.protocols import SleepingProtocol
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -40,3 +42,47 @@ class TestProject(TestCase):
             getruns.return_value = []
             proj = Project("domain", "path")
             proj.fixLinks("foo")
+
+
+class TestProjectLabels(pwtests.BaseTest):
+    """ Check the labels proposed for new and copied protocols. """
+
+    @classmethod
+    def setUpClass(cls):
+        pwtests.setupTestProject(cls, writeLocalConfig=True)
+
+    def _saveNew(self):
+        prot = self.proj.newProtocol(SleepingProtocol)
+        self.proj.saveProtocol(prot)
+        return prot
+
+    def _saveCopy(self, prot):
+        newProt = self.proj.copyProtocol(prot)
+        self.proj.saveProtocol(newProt)
+        return newProt
+
+    def test_labelsAfterDelete(self):
+        prot = self._saveNew()
+        label = prot.getObjLabel()
+        prot2 = self._saveNew()
+        self.assertEqual(label + ' (2)', prot2.getObjLabel())
+        copy = self._saveCopy(prot)
+        self.assertEqual(label + ' (copy)', copy.getObjLabel())
+
+        # Labels of deleted protocols can be used again
+        self.proj.deleteProtocol(prot2, copy)
+        self.assertEqual(label + ' (2)', self._saveNew().getObjLabel())
+        self.assertEqual(label + ' (copy)', self._saveCopy(prot).getObjLabel())
+
+    def test_labelsAfterRename(self):
+        prot = self.proj.newProtocol(SleepingProtocol, objLabel='to rename')
+        self.proj.saveProtocol(prot)
+        self.assertEqual('to rename (copy)', self._saveCopy(prot).getObjLabel())
+
+        prot.setObjLabel('renamed')
+        self.proj.saveProtocol(prot)
+        copy = self._saveCopy(prot)
+        self.assertEqual('renamed (copy)', copy.getObjLabel())
+        copy.setObjLabel('other')
+        self.proj.saveProtocol(copy)
+        self.assertEqual('renamed (copy)', self._saveCopy(prot).getObjLabel())
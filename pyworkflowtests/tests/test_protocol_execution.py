@@ -23,10 +23,15 @@
 # *
 # **************************************************************************
 
+import threading
+import time
+
 import pyworkflow.tests as pwtests
 import pyworkflow.mapper as pwmapper
 import pyworkflow.protocol as pwprot
 from pyworkflow.project import Project
+from pyworkflow.protocol.executor import StepThread, ThreadStepExecutor
+from pyworkflow.protocol.protocol import FunctionStep
 
 
 # TODO: this test seems not to be finished.
@@ -70,3 +75,42 @@ class TestProtocolExecution(pwtests.BaseTest):
         prot2 = mapper2.selectById(prot.getObjId())
         
         self.assertEqual(prot.endTime.get(), prot2.endTime.get())
+
+    def _createSteps(self, levels, width):
+        """ Create levels of width steps, each one depending on all
+        the steps of the previous level. """
+        steps = []
+        previous = []
+        for _ in range(levels):
+            current = []
+            for _ in range(width):
+                step = FunctionStep(time.sleep, 'sleep', 0.01)
+                step.addPrerequisites(*previous)
+                step.setStatus(pwprot.STATUS_NEW)
+                steps.append(step)
+                step._index = len(steps)
+                current.append(step._index)
+            previous = current
+        return steps
+
+    def test_ThreadStepExecutor(self):
+        levels = 8
+        steps = self._createSteps(levels, 3)
+        executor = ThreadStepExecutor(hostConfig=None, nThreads=3)
+
+        start = time.time()
+        executor.runSteps(steps, lambda step: None, lambda step: True,
+                          lambda: None, stepsCheckSecs=60)
+        elapsed = time.time() - start
+
+        self.assertTrue(all(s.isFinished() for s in steps))
+        # Finished threads wake up the executor, otherwise it would wait
+        # for the 0.5 seconds timeout at each level
+        self.assertLess(elapsed, levels * 0.5 / 2)
+
+    def test_StepThreadWithLock(self):
+        """ StepThread can still be used with a plain lock. """
+        step = self._createSteps(1, 1)[0]
+        # Call run() directly, so any error in it reaches the test
+        StepThread(0, step, threading.Lock()).run()
+        self.assertTrue(step.isFinished())
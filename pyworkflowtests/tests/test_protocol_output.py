@@ -26,6 +26,7 @@
 # *
 # **************************************************************************
 import os
+import sqlite3
 
 import pyworkflow as pw
 import pyworkflow.object as pwobj
@@ -147,6 +148,32 @@ class TestProtocolOutputs(pwtests.BaseTest):
         with self.assertRaises(Exception):
             self.launchProtocol(prot4)
 
+    def test_resetProtocol(self):
+        prot = self.newProtocol(ProtOutputTest, objLabel='to reset')
+        self.proj.saveProtocol(prot)
+        prot._defineOutputs(oBoxSize=pwobj.Integer(20))
+        self.proj._storeProtocol(prot)
+        self.assertOutput(prot)
+        outputId = prot.oBoxSize.getObjId()
+        self.proj.mapper.insertRelation('testRelation', prot, prot,
+                                        prot.oBoxSize)
+        self.proj.mapper.commit()
+
+        self.proj.resetProtocol(prot)
+        self.assertFalse(hasattr(prot, 'oBoxSize'))
+
+        # Changes must be committed, so visible from another connection
+        conn = sqlite3.connect(self.proj.getDbPath())
+        try:
+            self.assertIsNone(conn.execute("SELECT id FROM Objects "
+                                           "WHERE id=?",
+                                           (outputId,)).fetchone())
+            self.assertIsNone(conn.execute("SELECT id FROM Relations "
+                                           "WHERE parent_id=?",
+                                           (prot.getObjId(),)).fetchone())
+        finally:
+            conn.close()
+
     def assertOutput(self, prot, value=20):
         # Check there is an output
         self.assertTrue(hasattr(prot, 'oBoxSize'),
@@ -12,7 +12,7 @@ from subprocess import Popen
 from io import StringIO
 
 from pyworkflow import APPS
-from pyworkflow.utils.process import killWithChilds
+from pyworkflow.utils.process import killWithChilds, _splitCommand
 from pyworkflow.tests import *
 from pyworkflow.utils import utils, prettyDict, getListFromValues
 from pyworkflow.utils import ProgressBar
@@ -76,6 +76,13 @@ class TestProccess(BaseTest):
         time.sleep(5)
         killWithChilds(p.pid)
 
+    def test_splitCommand(self):
+        self.assertEqual(_splitCommand(' ls -l "a b"'), ['ls', '-l', 'a b'])
+        # Commands that need a shell are not split
+        for cmd in ['ls | wc', 'ls > out.txt', 'echo $HOME', 'ls *.py',
+                    'A=1 ls', 'cd .. && ls', 'ls `which ls`']:
+            self.assertIsNone(_splitCommand(cmd), cmd)
+
 
 class TestGetListFromRangeString(BaseTest):
 